@@ -0,0 +1,42 @@
+"""conversations.message_count — денормалізований лічильник повідомлень.
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18 00:00:00
+
+Backfill з messages, щоб rollover існуючих розмов працював одразу після міграції.
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "003"
+down_revision: Union[str, None] = "002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "conversations",
+        sa.Column("message_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute(
+        """
+        UPDATE conversations AS c
+        SET message_count = m.cnt
+        FROM (
+            SELECT conversation_id, COUNT(*) AS cnt
+            FROM messages
+            GROUP BY conversation_id
+        ) AS m
+        WHERE m.conversation_id = c.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("conversations", "message_count")
@@ -0,0 +1,28 @@
+"""messages.token_count — токени повідомлення для бюджету контексту.
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18 00:00:00
+
+Без backfill: токенізатор живе в Python, а не в SQL. Для старих рядків (NULL)
+кількість токенів рахується при читанні історії.
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "004"
+down_revision: Union[str, None] = "003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("messages", sa.Column("token_count", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("messages", "token_count")
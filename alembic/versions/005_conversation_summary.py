@@ -0,0 +1,30 @@
+"""conversations.summary — стислий зміст розмови для довгого контексту.
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 00:00:00
+
+summary_upto_id — id останнього повідомлення, вже врахованого в summary
+(наступне оновлення бере лише новіші).
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "005"
+down_revision: Union[str, None] = "004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("conversations", sa.Column("summary", sa.Text(), nullable=True))
+    op.add_column("conversations", sa.Column("summary_upto_id", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("conversations", "summary_upto_id")
+    op.drop_column("conversations", "summary")
@@ -0,0 +1,57 @@
+"""Одна активна conversation на користувача (частковий унікальний індекс).
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18 00:00:00
+
+Дублікати, що могли зʼявитись через гонку get-or-create, закриваються: активною
+лишається найновіша гілка (її ж вибирає ChatService при відсутньому active_conversation_id).
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "006"
+down_revision: Union[str, None] = "005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        UPDATE conversations AS c
+        SET status = 'closed'
+        WHERE c.status = 'active'
+          AND EXISTS (
+              SELECT 1 FROM conversations AS newer
+              WHERE newer.user_id = c.user_id
+                AND newer.status = 'active'
+                AND newer.id > c.id
+          )
+        """
+    )
+    op.execute(
+        """
+        UPDATE users AS u
+        SET active_conversation_id = c.id
+        FROM conversations AS c
+        WHERE c.user_id = u.id
+          AND c.status = 'active'
+          AND u.active_conversation_id IS DISTINCT FROM c.id
+        """
+    )
+    op.create_index(
+        "ux_conversations_user_active",
+        "conversations",
+        ["user_id"],
+        unique=True,
+        postgresql_where=sa.text("status = 'active'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_conversations_user_active", table_name="conversations")
@@ -0,0 +1,51 @@
+"""processed_updates — ідемпотентність обробки update Telegram.
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 00:00:00
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "007"
+down_revision: Union[str, None] = "006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "processed_updates",
+        sa.Column("update_id", sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column("chat_id", sa.BigInteger(), nullable=True),
+        sa.Column("message_id", sa.BigInteger(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("update_id"),
+    )
+    op.create_index(
+        "ux_processed_updates_chat_message",
+        "processed_updates",
+        ["chat_id", "message_id"],
+        unique=True,
+    )
+    op.create_index(
+        op.f("ix_processed_updates_created_at"),
+        "processed_updates",
+        ["created_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_processed_updates_created_at"), table_name="processed_updates")
+    op.drop_index("ux_processed_updates_chat_message", table_name="processed_updates")
+    op.drop_table("processed_updates")
@@ -0,0 +1,29 @@
+"""messages: prompt_tokens, cached_tokens, completion_tokens — usage LLM за хід.
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18 00:00:00
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "008"
+down_revision: Union[str, None] = "007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("messages", sa.Column("prompt_tokens", sa.Integer(), nullable=True))
+    op.add_column("messages", sa.Column("cached_tokens", sa.Integer(), nullable=True))
+    op.add_column("messages", sa.Column("completion_tokens", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("messages", "completion_tokens")
+    op.drop_column("messages", "cached_tokens")
+    op.drop_column("messages", "prompt_tokens")
@@ -0,0 +1,25 @@
+"""messages.prompt_version — версія system prompt, з якою пройшов хід.
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18 00:00:00
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "009"
+down_revision: Union[str, None] = "008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("messages", sa.Column("prompt_version", sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("messages", "prompt_version")
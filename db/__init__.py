@@ -3,23 +3,41 @@ Database — моделі (User, Conversation, Message), UnitOfWork, сесії,
 Імпортуй UnitOfWork та init_db звідси; моделі — для типів або прямого доступу.
 """
 
-from db.models import Base, Conversation, Message, User
+from db.locks import (
+    LOCK_NS_CHAT_TURN,
+    LOCK_NS_IDENTITY,
+    advisory_session_lock,
+    advisory_xact_lock,
+    get_lock_stats,
+)
+from db.models import Base, Conversation, LLMResponseCache, Message, ProcessedUpdate, User
 from db.session import (
     UnitOfWork,
     async_session_factory,
     engine,
     get_async_session,
+    get_pool_stats,
     init_db,
+    on_commit,
 )
 
 __all__ = [
+    "LOCK_NS_CHAT_TURN",
+    "LOCK_NS_IDENTITY",
     "Base",
     "Conversation",
+    "LLMResponseCache",
     "Message",
+    "ProcessedUpdate",
     "User",
     "UnitOfWork",
+    "advisory_session_lock",
+    "advisory_xact_lock",
     "async_session_factory",
     "engine",
     "get_async_session",
+    "get_lock_stats",
+    "get_pool_stats",
     "init_db",
+    "on_commit",
 ]
@@ -0,0 +1,140 @@
+"""
+Міжпроцесна координація через Postgres advisory locks (без Redis).
+
+Дві форми:
+- advisory_xact_lock(session, ns, key) — до кінця поточної транзакції (commit/rollback
+  відпускає сам Postgres). Для коротких критичних секцій: get-or-create user/conversation.
+- advisory_session_lock(ns, key, timeout) — на окремому зʼєднанні, поки триває блок.
+  Тримає зʼєднання з пулу весь цей час; з PgBouncer у transaction mode не працює.
+  Таких зʼєднань одночасно — не більше DB_SESSION_LOCK_MAX_CONNECTIONS: транзакції
+  всередині блоків беруть ще одне зʼєднання, і без ліміту locks (разом з тими, хто
+  чекає) займають увесь пул — UnitOfWork під lock чекає зʼєднання, яке ніхто не віддасть.
+
+Ключ — пара int4 (namespace, key32): різні призначення не перетинаються, а telegram_id
+(до 2^52) згортається в 32 біти — рідкісні колізії лише зайвий раз серіалізують.
+Час очікування кожного lock — у гістограмах (get_lock_stats).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from db.pool_stats import WaitHistogram
+from db.session import engine
+
+# Простори ключів (classid у pg_locks)
+LOCK_NS_IDENTITY = 0x54420001
+LOCK_NS_CHAT_TURN = 0x54420002
+
+# Пауза між спробами pg_try_advisory_lock
+_RETRY_DELAY_SEC = 0.05
+
+_histograms: dict[int, WaitHistogram] = {}
+# Слоти зʼєднань для advisory_session_lock (створюється в event loop при першому виклику)
+_session_slots: Optional[asyncio.Semaphore] = None
+
+
+def _session_lock_slots() -> asyncio.Semaphore:
+    global _session_slots
+    if _session_slots is None:
+        limit = settings.DB_SESSION_LOCK_MAX_CONNECTIONS
+        if limit <= 0:
+            # За замовчуванням — половина пулу: друга половина для транзакцій під lock
+            limit = max((settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW) // 2, 1)
+        _session_slots = asyncio.Semaphore(limit)
+    return _session_slots
+
+
+def _histogram(namespace: int) -> WaitHistogram:
+    hist = _histograms.get(namespace)
+    if hist is None:
+        hist = _histograms[namespace] = WaitHistogram()
+    return hist
+
+
+def lock_key(value: int) -> int:
+    """Згорнути bigint у signed int4 (другий аргумент pg_advisory_*lock(int, int))."""
+    folded = (value ^ (value >> 32)) & 0xFFFFFFFF
+    return folded - (1 << 32) if folded >= (1 << 31) else folded
+
+
+async def advisory_xact_lock(session: AsyncSession, namespace: int, key: int) -> None:
+    """Чекати lock до кінця транзакції session."""
+    start = time.perf_counter()
+    await session.execute(select(func.pg_advisory_xact_lock(namespace, lock_key(key))))
+    _histogram(namespace).observe((time.perf_counter() - start) * 1000)
+
+
+@asynccontextmanager
+async def advisory_session_lock(
+    namespace: int, key: int, timeout: float
+) -> AsyncIterator[bool]:
+    """
+    Lock на окремому зʼєднанні на час блоку. yield True — lock взято; False — не дочекались
+    за timeout (блок виконується без lock, викликач вирішує, чи це прийнятно).
+    Очікування вільного слота зʼєднання входить у timeout.
+    """
+    hist = _histogram(namespace)
+    key32 = lock_key(key)
+    start = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    slots = _session_lock_slots()
+    while slots.locked() and time.monotonic() < deadline:
+        await asyncio.sleep(_RETRY_DELAY_SEC)
+    if slots.locked():
+        hist.observe((time.perf_counter() - start) * 1000)
+        hist.timeouts += 1
+        yield False
+        return
+    # Слот вільний — acquire() не чекає, між перевіркою і взяттям немає await
+    await slots.acquire()
+    try:
+        async with _locked_connection(namespace, key32, hist, start, deadline) as acquired:
+            yield acquired
+    finally:
+        slots.release()
+
+
+@asynccontextmanager
+async def _locked_connection(
+    namespace: int, key32: int, hist: WaitHistogram, start: float, deadline: float
+) -> AsyncIterator[bool]:
+    async with engine.connect() as conn:
+        acquired = False
+        while True:
+            acquired = bool(
+                await conn.scalar(select(func.pg_try_advisory_lock(namespace, key32)))
+            )
+            # Не тримаємо відкриту транзакцію, поки чекаємо або виконується блок
+            await conn.commit()
+            if acquired or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(_RETRY_DELAY_SEC)
+        hist.observe((time.perf_counter() - start) * 1000)
+        if not acquired:
+            hist.timeouts += 1
+
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    await conn.scalar(select(func.pg_advisory_unlock(namespace, key32)))
+                    await conn.commit()
+                except BaseException:
+                    # Lock лишився б на зʼєднанні в пулі — закриваємо зʼєднання (Postgres відпустить)
+                    await conn.invalidate()
+                    raise
+
+
+def get_lock_stats() -> dict[str, Any]:
+    """Очікування advisory locks по просторах ключів."""
+    names = {LOCK_NS_IDENTITY: "identity", LOCK_NS_CHAT_TURN: "chat_turn"}
+    return {names.get(ns, str(ns)): hist.snapshot() for ns, hist in _histograms.items()}
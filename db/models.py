@@ -1,5 +1,7 @@
 """
 SQLAlchemy-моделі для історії діалогу: User, Conversation, Message.
+LLMResponseCache — Postgres-рівень кешу відповідей LLM (services/response_cache.py).
+ProcessedUpdate — вже оброблені update Telegram (services/update_dedup.py).
 """
 
 from __future__ import annotations
@@ -7,7 +9,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import DateTime, ForeignKey, Index, String, Text, func
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, String, Text, func, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -45,10 +47,24 @@ class Conversation(Base):
     """Одна діалогова гілка користувача. status: active / closed (при >200 повідомленнях)."""
 
     __tablename__ = "conversations"
+    # Не більше однієї активної гілки на користувача — навіть якщо дві репліки створюють одночасно
+    __table_args__ = (
+        Index(
+            "ux_conversations_user_active",
+            "user_id",
+            unique=True,
+            postgresql_where=text("status = 'active'"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     status: Mapped[str] = mapped_column(String(50), default="active")
+    # Денормалізований лічильник повідомлень: rollover без COUNT(*) по messages
+    message_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    # Стислий зміст розмови (services/summarizer.py) і id останнього повідомлення, що в нього увійшло
+    summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    summary_upto_id: Mapped[Optional[int]] = mapped_column(nullable=True)
 
     user: Mapped["User"] = relationship(
         "User", foreign_keys=[user_id], back_populates="conversations"
@@ -67,7 +83,7 @@ class Message(Base):
     """Повідомлення в діалозі. role: user | assistant | system."""
 
     __tablename__ = "messages"
-    # Композитний індекс для вибірки останніх N повідомлень по conversation_id + created_at
+    # Композитний індекс для вибірки останніх N повідомлень по conversation_id + created_at (DESC-скан)
     __table_args__ = (
         Index("ix_messages_conversation_created", "conversation_id", "created_at"),
     )
@@ -76,8 +92,49 @@ class Message(Base):
     conversation_id: Mapped[int] = mapped_column(ForeignKey("conversations.id"), index=True)
     role: Mapped[str] = mapped_column(String(50))
     content: Mapped[str] = mapped_column(Text)
+    # Токени content (services/tokenizer.py), рахуються один раз при записі. NULL — старі рядки
+    token_count: Mapped[Optional[int]] = mapped_column(nullable=True)
+    # Assistant msg: фактичний usage викликів LLM за хід (services/llm_usage.py).
+    # cached_tokens — частина prompt_tokens з prompt cache OpenAI. NULL — mock, кеш відповідей
+    prompt_tokens: Mapped[Optional[int]] = mapped_column(nullable=True)
+    cached_tokens: Mapped[Optional[int]] = mapped_column(nullable=True)
+    completion_tokens: Mapped[Optional[int]] = mapped_column(nullable=True)
+    # Версія system prompt ходу: "імʼя:хеш" (services/prompt_store.py). NULL — старі рядки
+    prompt_version: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), index=True
     )
 
     conversation: Mapped["Conversation"] = relationship("Conversation", back_populates="messages")
+
+
+class LLMResponseCache(Base):
+    """Кешована відповідь LLM. key — sha256 від (model, messages, tools)."""
+
+    __tablename__ = "llm_response_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    response: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+
+
+class ProcessedUpdate(Base):
+    """
+    Вже прийнятий update. Ключі — update_id і (chat_id, message_id) для нових повідомлень:
+    повторна доставка того самого update або того самого повідомлення пропускається.
+    """
+
+    __tablename__ = "processed_updates"
+    __table_args__ = (
+        Index("ux_processed_updates_chat_message", "chat_id", "message_id", unique=True),
+    )
+
+    update_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    chat_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    message_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), index=True
+    )
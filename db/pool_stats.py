@@ -0,0 +1,77 @@
+"""
+Метрики пулу зʼєднань: checked-out, overflow, час очікування зʼєднання (гістограма).
+
+InstrumentedQueuePool — AsyncAdaptedQueuePool, що міряє тривалість checkout
+(очікування вільного зʼєднання + pre-ping). get_pool_stats() читається в runtime.
+"""
+
+from __future__ import annotations
+
+import bisect
+import time
+from typing import Any
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Верхні межі бакетів гістограми очікування, мс (останній бакет — усе більше)
+WAIT_BUCKETS_MS: tuple[float, ...] = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class WaitHistogram:
+    """Кумулятивна гістограма часу checkout."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self.timeouts = 0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(WAIT_BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def snapshot(self) -> dict[str, Any]:
+        labels = [f"<={b:g}ms" for b in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]:g}ms"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.total,
+            "avg_ms": round(self.sum_ms / self.total, 3) if self.total else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "timeouts": self.timeouts,
+        }
+
+
+wait_histogram = WaitHistogram()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool з виміром часу checkout."""
+
+    def connect(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            wait_histogram.timeouts += 1
+            raise
+        finally:
+            wait_histogram.observe((time.perf_counter() - start) * 1000)
+
+
+def get_pool_stats(engine: Any) -> dict[str, Any]:
+    """Поточний стан пулу engine + гістограма очікування checkout."""
+    pool = engine.pool
+    stats: dict[str, Any] = {"pool": type(pool).__name__}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    stats["checkout_wait"] = wait_histogram.snapshot()
+    return stats
@@ -1,12 +1,16 @@
 """
 Async session factory, Unit of Work — один шар транзакцій.
+
+Параметри пулу (розмір, overflow, recycle, pre-ping, таймаут) і режим PgBouncer — з config.
+Стан пулу в runtime: db.get_pool_stats().
 """
 
 from __future__ import annotations
 
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
-from typing import Any
+from typing import Any, Callable
+from uuid import uuid4
 
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import (
@@ -17,11 +21,37 @@ from sqlalchemy.ext.asyncio import (
 
 from config import settings
 from db.models import Base
+from db.pool_stats import InstrumentedQueuePool, get_pool_stats as _get_pool_stats
 
 
+def _connect_args() -> dict[str, Any]:
+    """
+    Аргументи asyncpg. PgBouncer у transaction mode не підтримує prepared statements
+    між транзакціями — тоді кеші statement вимикаються, імена prepared statements унікальні.
+    """
+    if settings.DB_PGBOUNCER_MODE:
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+
+
+# Розмір пулу рахуй від max_connections Postgres: (pool_size + max_overflow) × репліки × процеси
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=False,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SEC,
+    pool_recycle=settings.DB_POOL_RECYCLE_SEC,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args=_connect_args(),
 )
 
 async_session_factory = async_sessionmaker(
@@ -33,12 +63,21 @@ async_session_factory = async_sessionmaker(
 )
 
 
+def on_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """
+    Викликати callback після успішного commit UnitOfWork (при rollback — ні).
+    Для in-process кешів: оновлюємо їх лише тим, що реально потрапило в БД.
+    """
+    session.info.setdefault("on_commit", []).append(callback)
+
+
 class UnitOfWork:
     """
     Unit of Work: одна транзакція на весь сценарій.
 
     При виході: commit при успіху, rollback при помилці, завжди close.
     Сервіси не роблять commit — лише flush() коли потрібен id.
+    Після commit виконуються callbacks, зареєстровані через on_commit().
     """
 
     session: AsyncSession
@@ -48,13 +87,18 @@ class UnitOfWork:
         return self
 
     async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        callbacks = []
         try:
             if exc_type is None:
                 await self.session.commit()
+                callbacks = self.session.info.pop("on_commit", [])
             else:
                 await self.session.rollback()
         finally:
+            self.session.info.pop("on_commit", None)
             await self.session.close()
+        for callback in callbacks:
+            callback()
 
 
 @asynccontextmanager
@@ -83,3 +127,8 @@ async def init_db() -> None:
     if settings.DB_CREATE_SCHEMA_ON_START:
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+
+
+def get_pool_stats() -> dict[str, Any]:
+    """Checked-out / overflow / гістограма очікування зʼєднання для основного engine."""
+    return _get_pool_stats(engine)
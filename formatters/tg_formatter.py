@@ -1,8 +1,10 @@
 """
 Форматування тексту для Telegram. Тільки HTML.
 
-Код (block і inline) спочатку виноситься в плейсхолдери, потім escape + bold/italic,
-потім код повертається. Жодного перетину тегів, жодних глобальних "очисток".
+Один прохід: текст екранується один раз, далі один regex-токенізатор іде зліва направо
+по блоках коду, inline-коду, посиланнях, маркерах списків і маркерах ** __ * _.
+Код не форматується. Жирний/курсив закриваються лише на парний маркер у тому ж
+рядку; маркер без пари лишається текстом, тож теги завжди правильно вкладені.
 """
 
 from __future__ import annotations
@@ -11,64 +13,138 @@ import html
 import re
 from typing import Tuple
 
-_CODE_BLOCK_RE = re.compile(r"```(?:\w+)?\n?([\s\S]*?)```", re.MULTILINE)
-_INLINE_CODE_RE = re.compile(r"`([^`]+)`")
-_BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
-_BOLD_UNDER_RE = re.compile(r"__(.+?)__")
-_ITALIC_RE = re.compile(r"\*([^*]+)\*")
-_ITALIC_UNDER_RE = re.compile(r"(?<![_])_([^_]+)_(?![_])")
-
+_TOKEN_RE = re.compile(
+    # Lookahead з першими символами всіх гілок: re пропускає звичайний текст швидким
+    # пошуком по класу символів, а не пробує кожну гілку на кожній позиції
+    r"(?=[`\[*_\n])(?:"
+    r"(?P<block>```(?:\w+)?\n?(?P<block_body>[\s\S]*?)```)"
+    r"|(?P<inline>`(?P<inline_body>[^`]+)`)"
+    r"|(?P<link>\[(?P<label>[^\[\]\n]+)\]\((?P<url>(?:https?|tg)://(?:[^\s()]|\([^\s()]*\))+)\))"
+    # Проста пара **...** / *...* без інших маркерів усередині — цілком у regex (найчастіший випадок)
+    r"|(?P<strong>\*\*(?=[^\s*])(?P<strong_body>[^*_`\[\n]+?)(?<=\S)\*\*(?!\*))"
+    r"|(?P<em>\*(?=[^\s*])(?P<em_body>[^*_`\[\n]+?)(?<=\S)\*(?!\*))"
+    r"|(?P<emphasis>\*{1,3}|_{1,3})"
+    # Маркер списку — разом з переносом рядка, щоб кожна гілка починалась з конкретного символу
+    r"|(?P<bullet>\n(?P<indent>[ \t]*)[-*+](?=[ \t]))"
+    r")"
+)
+_TAGS = {"**": "b", "__": "b", "*": "i", "_": "i"}
+_BULLET = "•"
+
+# Швидкий шлях для прози (без коду, посилань, "_" і "***"): три re.sub замість токенів у Python.
+# Ті самі шаблони, що й гілки bullet/strong/em вище; якщо після них лишилась "*" — маркер
+# без простої пари, і текст іде повним шляхом
+_FAST_BULLET_RE = re.compile(r"\n([ \t]*)[-*+](?=[ \t])")
+_FAST_STRONG_RE = re.compile(r"\*\*(?=[^\s*])([^*_`\[\n]+?)(?<=\S)\*\*(?!\*)")
+_FAST_EM_RE = re.compile(r"\*(?=[^\s*])([^*_`\[\n]+?)(?<=\S)\*(?!\*)")
+
+
+class _Renderer:
+    """
+    Вихідні шматки + стек відкритих маркерів: (маркер, індекс його шматка в out,
+    позиція в тексті — щоб не закривати пару через перенос рядка).
+    """
 
-def _placeholder(prefix: str, i: int) -> str:
-    """Токен, який не змінює html.escape і не збігається з ** / * / _."""
-    return f"\x00{prefix}{i}\x00"
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.out: list[str] = []
+        self.stack: list[tuple[str, int, int]] = []
+
+    def emphasis(self, run: str, pos: int, can_open: bool, can_close: bool) -> None:
+        # *** — це ** і *: відкриваються в порядку ** *, закриваються * **
+        if len(run) < 3:
+            markers = [run]
+        elif can_close and any(entry[0] in (run[0], run[:2]) for entry in self.stack):
+            markers = [run[0], run[:2]]
+        else:
+            markers = [run[:2], run[0]]
+        for marker in markers:
+            if can_close and self._close(marker, pos):
+                continue
+            if can_open:
+                self.stack.append((marker, len(self.out), pos))
+            self.out.append(marker)
+
+    def _close(self, marker: str, pos: int) -> bool:
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] != marker:
+                continue
+            start, opened_at = self.stack[i][1], self.stack[i][2]
+            if self.text.find("\n", opened_at, pos) != -1:
+                # Відкрито в попередньому рядку — і цей, і всі старші маркери вже без пари
+                self.reset()
+                return False
+            if start == len(self.out) - 1:
+                # Порожній вміст (****) — не форматуємо
+                return False
+            # Незакриті маркери між парою лишаються текстом — інакше теги перетнулись би
+            del self.stack[i:]
+            tag = _TAGS[marker]
+            self.out[start] = f"<{tag}>"
+            self.out.append(f"</{tag}>")
+            return True
+        return False
+
+    def reset(self) -> None:
+        """Кінець рядка або блок коду: відкриті маркери лишаються звичайним текстом."""
+        self.stack.clear()
 
 
 def format_for_telegram(text: str) -> Tuple[str, str]:
     """
     Готує текст для відправки в Telegram. Один parse_mode — HTML.
 
-    Порядок: витягнути block code → inline code → escape → bold/italic → повернути код.
-    Курсив і жирний не застосовуються всередині коду. Перетину тегів немає.
+    ```код``` → <pre><code>, `код` → <code>, **/__ → <b>, */_ → <i>,
+    [текст](https://...) → <a href>, рядки "- " / "* " / "+ " → "• ".
+    Курсив і жирний не застосовуються всередині коду і не переходять через рядок;
+    _ всередині слова (snake_case) — не курсив.
     """
     if not text or not text.strip():
         return "", "HTML"
 
-    raw = text.strip()
-
-    # 1. Винести блоки коду в плейсхолдери
-    blocks: list[str] = []
-
-    def block_repl(m: re.Match) -> str:
-        blocks.append(m.group(1))
-        return _placeholder("B", len(blocks) - 1)
-
-    s = _CODE_BLOCK_RE.sub(block_repl, raw)
-
-    # 2. Винести inline-код в плейсхолдери
-    inlines: list[str] = []
-
-    def inline_repl(m: re.Match) -> str:
-        inlines.append(m.group(1))
-        return _placeholder("I", len(inlines) - 1)
-
-    s = _INLINE_CODE_RE.sub(inline_repl, s)
-
-    # 3. Екранувати звичайний текст (плейсхолдери залишаються)
-    s = html.escape(s)
-
-    # 4. Жирний і курсив тільки в не-коді
-    s = _BOLD_RE.sub(r"<b>\1</b>", s)
-    s = _BOLD_UNDER_RE.sub(r"<b>\1</b>", s)
-    s = _ITALIC_RE.sub(r"<i>\1</i>", s)
-    s = _ITALIC_UNDER_RE.sub(r"<i>\1</i>", s)
-
-    # 5. Повернути блоки коду (вміст екрануємо при вставці)
-    for i, content in enumerate(blocks):
-        s = s.replace(_placeholder("B", i), f"<pre><code>{html.escape(content)}</code></pre>")
-
-    # 6. Повернути inline-код
-    for i, content in enumerate(inlines):
-        s = s.replace(_placeholder("I", i), f"<code>{html.escape(content)}</code>")
-
-    return s.strip(), "HTML"
+    # Маркери розмітки escape не змінює — токенізуємо вже екранований текст.
+    # "\n" на початку — щоб маркер списку в першому рядку знайшла та сама гілка newline
+    s = "\n" + html.escape(text.strip())
+    if "`" not in s and "[" not in s and "_" not in s and "***" not in s:
+        fast = _FAST_BULLET_RE.sub(rf"\n\1{_BULLET}", s)
+        fast = _FAST_STRONG_RE.sub(r"<b>\1</b>", fast)
+        fast = _FAST_EM_RE.sub(r"<i>\1</i>", fast)
+        if "*" not in fast:
+            return fast.strip(), "HTML"
+
+    r = _Renderer(s)
+    out = r.out
+    pos = 0
+    for m in _TOKEN_RE.finditer(s):
+        start, end = m.span()
+        if start > pos:
+            out.append(s[pos:start])
+        pos = end
+        kind = m.lastgroup
+        if kind == "emphasis":
+            run = m.group()
+            prev = s[start - 1] if start > 0 else " "
+            nxt = s[end] if end < len(s) else " "
+            can_open = not nxt.isspace()
+            can_close = not prev.isspace()
+            if run[0] == "_":
+                can_open = can_open and not prev.isalnum()
+                can_close = can_close and not nxt.isalnum()
+            r.emphasis(run, start, can_open, can_close)
+        elif kind == "strong":
+            out.append(f"<b>{m.group('strong_body')}</b>")
+        elif kind == "em":
+            out.append(f"<i>{m.group('em_body')}</i>")
+        elif kind == "bullet":
+            out.append(f"\n{m.group('indent')}{_BULLET}")
+            r.reset()
+        elif kind == "inline":
+            out.append(f"<code>{m.group('inline_body')}</code>")
+        elif kind == "block":
+            out.append(f"<pre><code>{m.group('block_body')}</code></pre>")
+            r.reset()
+        else:  # link
+            out.append(f'<a href="{m.group("url")}">{m.group("label")}</a>')
+    out.append(s[pos:])
+
+    return "".join(out).strip(), "HTML"
@@ -12,10 +12,12 @@ from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.exceptions import TelegramBadRequest
 
-from db import UnitOfWork
+from config import settings
 from logger import logger
-from services.chat_service import ChatService
+from services.chat_dispatcher import ChatDispatcher
+from services.chat_service import run_chat_turn, stream_chat_turn
 from formatters.tg_formatter import format_for_telegram
+from handlers.streaming import StreamingReply
 from tools.text_chunking import chunk_text
 
 router = Router()
@@ -34,10 +36,12 @@ def _strip_markdown_for_log(text: str) -> str:
 @router.message(F.text)
 async def handle_chat_message(message: Message) -> None:
     """
-    Flow: отримати повідомлення → AI → форматування → відправити.
+    Flow: отримати повідомлення → черга чату (chat_dispatcher) → AI → форматування → відправити.
 
-    Fallback: ловимо TelegramBadRequest при send_message — тоді plain text.
-    Чому саме тут: fallback працює лише коли ловимо помилку Telegram API, не в formatter.
+    Handler лише ставить повідомлення в чергу і повертається (чекає, лише коли обробки
+    вже чекають CHAT_MAX_PENDING повідомлень). Повідомлення одного користувача в одному
+    чаті обробляються по черзі; ті, що прийшли в межах CHAT_COALESCE_WINDOW_MS, склеюються
+    в один запит до AI і одну відповідь (_process_batch).
     """
     user_text = message.text or ""
     # Команди (/start, /help тощо) не передаємо в AI — ігноруємо
@@ -50,18 +54,32 @@ async def handle_chat_message(message: Message) -> None:
         message=f"Повідомлення від {message.from_user.id}: {user_text}",
     )
 
+    # typing одразу: користувач бачить реакцію, поки триває debounce-вікно
     await message.bot.send_chat_action(chat_id=message.chat.id, action="typing")
+    # Ключ — (чат, користувач): розмова в БД привʼязана до користувача, а відповідь іде
+    # в чат — повідомлення з різних чатів не склеюються і не йдуть відповіддю не туди.
+    # Ходи одного користувача з різних чатів серіалізує lock ходу (chat_service)
+    await chat_dispatcher.submit((message.chat.id, message.from_user.id), message)
 
-    # Одна транзакція: user msg + assistant msg; при помилці AI — rollback, нічого не зберігається
-    async with UnitOfWork() as uow:
-        chat_service = ChatService(uow.session)
-        raw_reply = await chat_service.process_message(
-            telegram_id=message.from_user.id,
-            username=message.from_user.username,
-            user_text=user_text,
-        )
 
-    formatted_reply, parse_mode = format_for_telegram(raw_reply)
+async def _process_batch(_key: tuple[int, int], messages: list[Message]) -> None:
+    """
+    Один хід для пачки повідомлень: тексти склеюються через порожній рядок,
+    відповідь — на останнє повідомлення.
+
+    Fallback: ловимо TelegramBadRequest при send_message — тоді plain text.
+    Чому саме тут: fallback працює лише коли ловимо помилку Telegram API, не в formatter.
+    """
+    message = messages[-1]
+    user_text = "\n\n".join(m.text.strip() for m in messages)
+
+    if len(messages) > 1:
+        await message.bot.send_chat_action(chat_id=message.chat.id, action="typing")
+
+    if settings.LLM_STREAMING:
+        raw_reply = await _reply_streaming(message, user_text)
+    else:
+        raw_reply = await _reply_once(message, user_text)
 
     reply_for_log = _strip_markdown_for_log(raw_reply)
     await logger.log(
@@ -69,6 +87,27 @@ async def handle_chat_message(message: Message) -> None:
         module=__name__,
         message=f"Відповідь: {reply_for_log}",
     )
+
+
+chat_dispatcher: ChatDispatcher[Message] = ChatDispatcher(
+    _process_batch,
+    debounce=settings.CHAT_COALESCE_WINDOW_MS / 1000,
+    max_batch=settings.CHAT_COALESCE_MAX_MESSAGES,
+    max_pending=settings.CHAT_MAX_PENDING,
+)
+
+
+async def _reply_once(message: Message, user_text: str) -> str:
+    """Звичайний режим: дочекатися повної відповіді, відформатувати, відправити частинами."""
+    # Дві короткі транзакції (user msg / assistant msg); під час LLM зʼєднання з БД вільне
+    raw_reply = await run_chat_turn(
+        telegram_id=message.from_user.id,
+        username=message.from_user.username,
+        user_text=user_text,
+    )
+
+    formatted_reply, parse_mode = format_for_telegram(raw_reply)
+
     try:
         for chunk in chunk_text(formatted_reply):
             await message.answer(chunk, parse_mode=parse_mode)
@@ -80,3 +119,28 @@ async def handle_chat_message(message: Message) -> None:
         )
         for chunk in chunk_text(raw_reply.strip()):
             await message.answer(chunk)
+    return raw_reply
+
+
+async def _reply_streaming(message: Message, user_text: str) -> str:
+    """
+    Stream-режим: перше повідомлення після перших токенів, далі throttled edit.
+    Повний текст зберігає stream_chat_turn після завершення stream.
+    """
+    reply = StreamingReply(message, edit_interval=settings.STREAM_EDIT_INTERVAL_SEC)
+    parts: list[str] = []
+    stream = stream_chat_turn(
+        telegram_id=message.from_user.id,
+        username=message.from_user.username,
+        user_text=user_text,
+    )
+    try:
+        async for delta in stream:
+            parts.append(delta)
+            await reply.push(delta)
+    finally:
+        # Якщо відправка впала посеред stream — генератор однаково зберігає відповідь
+        # і відпускає lock ходу (його finally), а не висить до збирання сміття
+        await stream.aclose()
+    await reply.finish()
+    return "".join(parts)
@@ -0,0 +1,119 @@
+"""
+Прогресивна відповідь у Telegram: перше повідомлення одразу після перших токенів,
+далі — edit_message_text не частіше ніж раз на edit_interval.
+
+Чому окремий файл: це чиста Telegram-логіка (send/edit, ліміти, fallback), без AI.
+Роутера тут немає — клас використовує handlers/chat.py.
+
+Поки йде stream, текст показується plain (незакритий markdown ламає HTML).
+Наприкінці кожне повідомлення редагується у відформатований HTML; при
+TelegramBadRequest — лишається plain text. Якщо текст перевищує MAX_CHUNK_LEN —
+поточне повідомлення фіналізується і відповідь продовжується новим.
+
+Помилки Telegram у push() не зупиняють stream: проміжне оновлення пропускається
+(WARNING), наступний push або finish() покажуть актуальний текст. Інакше відповідь
+моделі обірвалась би посеред ходу і не збереглась би в БД.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Optional
+
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+from formatters.tg_formatter import format_for_telegram
+from logger import logger
+from tools.text_chunking import MAX_CHUNK_LEN, chunk_text
+
+
+class StreamingReply:
+    """Одна відповідь бота, яка може займати кілька Telegram-повідомлень."""
+
+    def __init__(self, message: Message, edit_interval: float = 1.0):
+        self._origin = message
+        self._edit_interval = edit_interval
+        # segments[i] — сирий текст i-го повідомлення; sent[i] — вже відправлене повідомлення
+        self._segments: list[str] = [""]
+        self._sent: list[Optional[Message]] = [None]
+        self._shown = ""
+        self._next_edit_at = 0.0
+
+    async def push(self, delta: str) -> None:
+        """Додати шматок тексту. Відправка/редагування — з урахуванням throttle."""
+        self._segments[-1] += delta
+        try:
+            await self._show()
+        except TelegramRetryAfter as e:
+            self._next_edit_at = time.monotonic() + e.retry_after
+        except TelegramAPIError as e:
+            await logger.log(
+                level="WARNING",
+                module=__name__,
+                message=f"Проміжне оновлення відповіді не відправлено: {e}",
+            )
+            self._next_edit_at = time.monotonic() + self._edit_interval
+
+    async def _show(self) -> None:
+        # Rollover: відрізаємо заповнене повідомлення і продовжуємо новим
+        while len(self._segments[-1]) > MAX_CHUNK_LEN:
+            head, *rest = chunk_text(self._segments[-1])
+            self._segments[-1] = head
+            self._segments.append("".join(rest))
+            self._sent.append(None)
+            self._shown = ""
+            self._next_edit_at = 0.0
+            await self._finalize(len(self._segments) - 2)
+
+        text = self._segments[-1]
+        if not text.strip() or time.monotonic() < self._next_edit_at:
+            return
+        if self._sent[-1] is None:
+            # Перше повідомлення сегмента — одразу, це і є time-to-first-token для користувача
+            self._sent[-1] = await self._origin.answer(text)
+            self._shown = text
+            self._next_edit_at = time.monotonic() + self._edit_interval
+        elif text != self._shown:
+            await self._edit_plain(text)
+
+    async def finish(self) -> None:
+        """Stream завершився: фінальний HTML для останнього повідомлення."""
+        await self._finalize(len(self._segments) - 1)
+
+    async def _edit_plain(self, text: str) -> None:
+        try:
+            await self._sent[-1].edit_text(text)
+            self._shown = text
+        except TelegramRetryAfter as e:
+            # Ліміт редагувань — просто пропускаємо проміжні оновлення
+            self._next_edit_at = time.monotonic() + e.retry_after
+            return
+        except TelegramBadRequest:
+            pass
+        self._next_edit_at = time.monotonic() + self._edit_interval
+
+    async def _finalize(self, index: int) -> None:
+        raw = self._segments[index].strip()
+        if not raw:
+            return
+        formatted, parse_mode = format_for_telegram(raw)
+        sent = self._sent[index]
+        try:
+            if sent is None:
+                self._sent[index] = await self._origin.answer(formatted, parse_mode=parse_mode)
+            else:
+                await sent.edit_text(formatted, parse_mode=parse_mode)
+        except TelegramRetryAfter as e:
+            # Фінальний текст пропускати не можна — чекаємо і повторюємо
+            await asyncio.sleep(e.retry_after)
+            await self._finalize(index)
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                return
+            # HTML відхилено — лишаємо/відправляємо plain text
+            if sent is None:
+                self._sent[index] = await self._origin.answer(raw)
+            elif raw != self._shown:
+                await sent.edit_text(raw)
@@ -1,4 +1,12 @@
+from config import settings
 from logger.logger_module import Logger
 
 # Global logger object
-logger = Logger(log_to_telegram=True)
+logger = Logger(
+    log_to_telegram=True,
+    log_file=settings.LOG_FILE,
+    flush_interval=settings.LOG_FLUSH_INTERVAL_SEC,
+    max_file_bytes=settings.LOG_MAX_FILE_BYTES,
+    backup_count=settings.LOG_BACKUP_COUNT,
+    telegram_levels=settings.LOG_TELEGRAM_LEVELS.split(","),
+)
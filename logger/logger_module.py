@@ -1,6 +1,13 @@
 import asyncio
+import os
+import time
 from datetime import datetime
-from logger.telegram import send_telegram_message
+from typing import Optional
+
+from logger.telegram import TelegramLogSink
+
+# Маркер зупинки для writer-таска (кладеться в чергу при close())
+_STOP = object()
 
 
 class Logger:
@@ -18,6 +25,12 @@ class Logger:
         log_to_file=True,
         log_to_telegram=False,
         log_file="logs.txt",
+        max_queue_size=10000,
+        flush_interval=1.0,
+        flush_batch_size=200,
+        max_file_bytes=10 * 1024 * 1024,
+        backup_count=5,
+        telegram_levels=("WARNING", "ERROR", "CRITICAL"),
     ):
         """
         Initialize the logger.
@@ -26,16 +39,39 @@ class Logger:
         :param log_to_file: Whether to save logs to a file
         :param log_to_telegram: Whether to send logs to Telegram
         :param log_file: Name of the log file
+        :param max_queue_size: Max records waiting for the file writer (overflow is dropped and counted)
+        :param flush_interval: Seconds between file flushes
+        :param flush_batch_size: Flush earlier once this many records are buffered
+        :param max_file_bytes: Rotate the log file after this size (0 = never rotate)
+        :param backup_count: How many rotated files to keep (logs.txt.1 ... logs.txt.N)
+        :param telegram_levels: Levels forwarded to Telegram (others stay in console/file)
         """
         self.default_level = default_level
         self.log_to_file = log_to_file
         self.log_to_telegram = log_to_telegram
         self.log_file = log_file
+        self.max_queue_size = max_queue_size
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self.max_file_bytes = max_file_bytes
+        self.backup_count = backup_count
+        self._telegram_sink = (
+            TelegramLogSink(levels=telegram_levels) if log_to_telegram else None
+        )
+
+        # Черга і writer-таск створюються ліниво — у момент першого log() всередині event loop
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._file = None
+        self._closed = False
+        self.dropped = 0
 
     async def log(self, level: str, message: str, module: str = "General"):
         """
         Log a message.
 
+        Не робить файлового I/O: запис лише кладеться в чергу, файл пише фоновий writer.
+
         :param level: Log level (INFO, WARNING, ERROR, CRITICAL, DEBUG)
         :param message: Log message
         :param module: Module or component where the log originated
@@ -49,29 +85,134 @@ class Logger:
 
         # Write to file if enabled
         if self.log_to_file:
-            try:
-                with open(self.log_file, "a") as file:
-                    file.write(log_entry + "\n")
-            except IOError as e:
-                print(f"Failed to write log to file: {e}")
+            self._enqueue(log_entry)
 
         # Відправляємо в Telegram лише важливі рівні, щоб не спамити чат
         # Чому так: INFO/DEBUG можуть бути частими (наприклад кожне повідомлення користувача)
         if self.log_to_telegram:
-            await self._send_to_telegram(log_entry)
+            self._send_to_telegram(level, log_entry)
+
+    def _enqueue(self, log_entry: str) -> None:
+        """Кладе запис у чергу writer-а. Якщо черга переповнена — запис відкидається і рахується."""
+        if self._closed:
+            return
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(log_entry)
+        except asyncio.QueueFull:
+            self.dropped += 1
 
-    async def _send_to_telegram(self, message: str):
+    def _ensure_writer(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.get_running_loop().create_task(self._writer_loop())
+
+    async def _writer_loop(self) -> None:
+        """
+        Фоновий writer: збирає записи в буфер і скидає у файл пачкою —
+        раз на flush_interval або при flush_batch_size записах.
         """
-        Send a log message to Telegram.
+        buffer: list[str] = []
+        deadline = time.monotonic() + self.flush_interval
+        stop = False
+        while not stop:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                if item is _STOP:
+                    stop = True
+                else:
+                    buffer.append(item)
+                # Забираємо все, що вже лежить у черзі, без очікування
+                while not stop and len(buffer) < self.flush_batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                    else:
+                        buffer.append(item)
+            except asyncio.TimeoutError:
+                pass
+
+            if buffer and (
+                stop or len(buffer) >= self.flush_batch_size or time.monotonic() >= deadline
+            ):
+                lines, buffer = buffer, []
+                await self._flush(lines)
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+
+        await asyncio.to_thread(self._close_file)
 
+    async def _flush(self, lines: list) -> None:
+        """Запис пачки у файл у потоці — event loop не блокується на диску."""
+        try:
+            await asyncio.to_thread(self._write_lines, lines)
+        except OSError as e:
+            print(f"Failed to write log to file: {e}")
+
+    def _write_lines(self, lines: list) -> None:
+        if self._file is None:
+            self._file = open(self.log_file, "a", encoding="utf-8")
+        self._file.write("\n".join(lines) + "\n")
+        self._file.flush()
+        if self.max_file_bytes and self._file.tell() >= self.max_file_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        """Ротація як у logging.RotatingFileHandler: logs.txt → logs.txt.1 → ... → logs.txt.N."""
+        self._close_file()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                src = f"{self.log_file}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.log_file}.{i + 1}")
+            os.replace(self.log_file, f"{self.log_file}.1")
+        else:
+            # Без бекапів — просто обнуляємо файл
+            open(self.log_file, "w").close()
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def close(self) -> None:
+        """
+        Дочекатися запису всіх записів з черги, відправки Telegram-батчу і закрити файл.
+        Викликається при зупинці бота (main.py).
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._telegram_sink is not None:
+            await self._telegram_sink.close()
+        if self._writer_task is None or self._writer_task.done():
+            return
+        await self._queue.put(_STOP)
+        await self._writer_task
+        if self.dropped:
+            print(f"Logger: {self.dropped} records dropped (queue overflow)")
+
+    def _send_to_telegram(self, level: str, message: str):
+        """
+        Queue a log message for Telegram (only configured levels, sent in batches).
+
+        :param level: Log level
         :param message: Log message
         """
-        await send_telegram_message(message)
+        if self._telegram_sink is not None:
+            self._telegram_sink.submit(level, message)
 
 
 if __name__ == "__main__":
     from logger import logger
 
-    asyncio.run(
-        logger.log(level="ERROR", module="Рассылка отчетов", message="Тестовый лог")
-    )
+    async def _demo():
+        await logger.log(level="ERROR", module="Рассылка отчетов", message="Тестовый лог")
+        await logger.close()
+
+    asyncio.run(_demo())
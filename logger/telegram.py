@@ -1,22 +1,35 @@
 """
 Відправка логів у Telegram-групу. HTML escape, chunking по 3800 символів.
-Викликається з logger_module при level ERROR/CRITICAL (якщо log_to_telegram=True).
+
+TelegramLogSink — фоновий sink для logger_module: приймає лише налаштовані рівні,
+склеює записи у мінімум повідомлень, тримає одну aiohttp-сесію, поважає 429 retry_after
+і при переповненні черги відкидає записи з підсумком "N records suppressed".
 """
+from __future__ import annotations
+
 import html
 import aiohttp
 import asyncio
+from typing import Iterable, Optional
 
 from config import settings
-from tools.text_chunking import chunk_text
+from tools.text_chunking import MAX_CHUNK_LEN, chunk_text
+
+# Скільки разів повторювати відправку одного повідомлення (429 / мережеві помилки)
+_MAX_SEND_ATTEMPTS = 3
+
+
+def _api_url() -> str:
+    token = settings.TELEGRAM_BOT_FOR_REPORTS_KEY or settings.BOT_TOKEN
+    return f"https://api.telegram.org/bot{token}/sendMessage"
 
 
 async def send_telegram_message(message: str) -> None:
     """Відправити текст у групу (chat_id з config). Довгі повідомлення — кількома частинами."""
     escaped = html.escape(message, quote=False)
 
-    token = settings.BOT_TOKEN
     chat_id = settings.TELEGRAM_GROUP_ID_FOR_LOGGER
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
+    url = _api_url()
 
     async with aiohttp.ClientSession() as session:
         for chunk in chunk_text(escaped):
@@ -29,5 +42,134 @@ async def send_telegram_message(message: str) -> None:
                 print(f"Failed to send message to Telegram: {e}")
 
 
+class TelegramLogSink:
+    """
+    Неблокуючий sink логів у Telegram.
+
+    submit() лише кладе запис у чергу; фоновий таск раз на batch_delay збирає все
+    накопичене, пакує у повідомлення до MAX_CHUNK_LEN символів і відправляє послідовно.
+    """
+
+    def __init__(
+        self,
+        levels: Iterable[str] = ("WARNING", "ERROR", "CRITICAL"),
+        max_queue_size: int = 1000,
+        batch_delay: float = 2.0,
+        min_send_interval: float = 1.0,
+    ):
+        self.levels = {lvl.strip().upper() for lvl in levels if lvl.strip()}
+        self.max_queue_size = max_queue_size
+        self.batch_delay = batch_delay
+        self.min_send_interval = min_send_interval
+        self.enabled = bool(settings.TELEGRAM_GROUP_ID_FOR_LOGGER)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._closed = False
+        self.suppressed = 0
+
+    def accepts(self, level: str) -> bool:
+        return self.enabled and not self._closed and level.upper() in self.levels
+
+    def submit(self, level: str, log_entry: str) -> None:
+        """Поставити запис у чергу. Ніколи не чекає мережі; при переповненні — рахує відкинуті."""
+        if not self.accepts(level):
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        try:
+            self._queue.put_nowait(log_entry)
+        except asyncio.QueueFull:
+            self.suppressed += 1
+
+    async def _run(self) -> None:
+        while True:
+            first = await self._queue.get()
+            if first is None:
+                break
+            # Даємо записам накопичитись, щоб відправити їх одним повідомленням
+            await asyncio.sleep(self.batch_delay)
+            records = [first]
+            stop = False
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                records.append(item)
+            await self._send_batch(records)
+            if stop:
+                break
+
+    def _pack(self, records: list[str]) -> list[str]:
+        """Склеює записи (вже з HTML escape) у якомога менше повідомлень до MAX_CHUNK_LEN."""
+        lines: list[str] = []
+        if self.suppressed:
+            lines.append(f"⚠️ {self.suppressed} records suppressed (log queue overflow)")
+            self.suppressed = 0
+        lines.extend(html.escape(r, quote=False) for r in records)
+
+        messages: list[str] = []
+        current = ""
+        for line in lines:
+            for part in chunk_text(line):
+                candidate = f"{current}\n{part}" if current else part
+                if len(candidate) <= MAX_CHUNK_LEN:
+                    current = candidate
+                else:
+                    messages.append(current)
+                    current = part
+        if current:
+            messages.append(current)
+        return messages
+
+    async def _send_batch(self, records: list[str]) -> None:
+        for i, text in enumerate(self._pack(records)):
+            if i:
+                await asyncio.sleep(self.min_send_interval)
+            await self._send(text)
+
+    async def _send(self, text: str) -> None:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+        payload = {
+            "chat_id": settings.TELEGRAM_GROUP_ID_FOR_LOGGER,
+            "text": text,
+            "parse_mode": "HTML",
+        }
+        for _ in range(_MAX_SEND_ATTEMPTS):
+            try:
+                async with self._session.post(_api_url(), json=payload) as response:
+                    if response.status == 429:
+                        data = await response.json()
+                        retry_after = (data.get("parameters") or {}).get("retry_after", 5)
+                        await asyncio.sleep(retry_after)
+                        continue
+                    response.raise_for_status()
+                    await response.json()
+                    return
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Failed to send message to Telegram: {e}")
+                await asyncio.sleep(self.min_send_interval)
+        print("Failed to send message to Telegram: retries exhausted, batch dropped")
+
+    async def close(self) -> None:
+        """Дочекатися відправки черги і закрити HTTP-сесію."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is not None and not self._task.done():
+            await self._queue.put(None)
+            await self._task
+        if self._session is not None:
+            await self._session.close()
+
+
 if __name__ == "__main__":
     asyncio.run(send_telegram_message("test"))
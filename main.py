@@ -15,7 +15,15 @@ from config import settings
 from db import init_db
 from logger import logger
 from handlers import start, chat
+from middlewares.update_dedup import UpdateDedupMiddleware
+from services import openai_client, runtime_stats, tokenizer
+from services.prompt_store import prompt_store
+from services.chat_service import message_writer
+from services.summarizer import summarizer
+from services.update_dedup import update_dedup
+from tools import executor as tool_executor
 from tools.registry import register_all_tools
+from webhook import run_webhook
 
 
 def register_routers(dp: Dispatcher) -> None:
@@ -24,20 +32,74 @@ def register_routers(dp: Dispatcher) -> None:
     dp.include_router(chat.router)
 
 
-async def main() -> None:
-    bot = Bot(token=settings.BOT_TOKEN)
-    dp = Dispatcher()
-
+async def setup(dp: Dispatcher) -> None:
+    """Ініціалізація процесу: tools, БД, роутери, OpenAI, токенізатор (і для воркерів supervisor)."""
     # Явна реєстрація tools — без “магії” імпортів
     register_all_tools()
     # Перевірка підключення до БД; при DB_CREATE_SCHEMA_ON_START=True — create_all(). Інакше схема лише з Alembic.
     await init_db()
 
+    # До роутерів: повторно доставлений update не запускає жодного handler-а
+    dp.update.outer_middleware(UpdateDedupMiddleware())
     register_routers(dp)
 
+    # Один OpenAI-клієнт на процес; прогрів, щоб перше повідомлення не платило за TLS handshake
+    openai_client.init_client()
+    try:
+        await openai_client.warmup()
+    except Exception as e:
+        await logger.log(level="WARNING", module=__name__, message=f"OpenAI warmup не вдався: {e}")
+
+    # Промпти — один раз з диска, далі фонова перевірка mtime (гаряче оновлення)
+    await prompt_store.start()
+
+    # Словник токенізатора — один раз і не в event loop (читання з диска або мережі)
+    tokenizer_name = await asyncio.to_thread(tokenizer.init)
+    await logger.log(level="INFO", module=__name__, message=f"Токенізатор: {tokenizer_name}")
+
+    # Метрики: GET /stats (webhook) і періодичний рядок у лог (polling, воркери supervisor)
+    runtime_stats.register("chat_dispatcher", chat.chat_dispatcher.stats)
+    runtime_stats.stats_reporter.start()
+
+
+async def cleanup(bot: Bot) -> None:
+    """Зупинка процесу: дочекатися черг і закрити клієнти в правильному порядку."""
+    # Дочекатися ходів, які вже в черзі чатів, поки клієнт OpenAI і БД ще живі
+    await chat.chat_dispatcher.close()
+    await runtime_stats.stats_reporter.close()
+    await bot.session.close()
+    await summarizer.close()
+    await update_dedup.close()
+    await prompt_store.close()
+    await openai_client.close_client()
+    tool_executor.shutdown()
+    # Записати в БД повідомлення, що ще в черзі write-behind
+    if message_writer is not None:
+        await message_writer.close()
+    # Дописати у файл усе, що ще в черзі логера
+    await logger.close()
+
+
+async def main() -> None:
+    bot = Bot(token=settings.BOT_TOKEN)
+    dp = Dispatcher()
+    await setup(dp)
+
     await logger.log(level="INFO", module=__name__, message="Бот запущено")
-    await dp.start_polling(bot)
+    try:
+        if settings.BOT_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        await cleanup(bot)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if settings.WORKER_PROCESSES > 1:
+        # Supervisor: приймає оновлення і розподіляє їх між процесами-воркерами
+        from supervisor import run_supervisor
+
+        asyncio.run(run_supervisor())
+    else:
+        asyncio.run(main())
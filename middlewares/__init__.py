@@ -0,0 +1,6 @@
+"""
+Middlewares — обробка update до handler-ів (aiogram outer middleware).
+
+Чому окрема папка: наскрізні перевірки (дедуплікація, ліміти) не змішуються
+з логікою конкретних сценаріїв у handlers.
+"""
@@ -0,0 +1,36 @@
+"""
+Outer middleware на dp.update: повторно доставлений update не доходить до жодного handler-а.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from logger import logger
+from services.update_dedup import update_dedup
+
+
+class UpdateDedupMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+        # (chat_id, message_id) — лише для нових повідомлень: edited_message має той самий id
+        message = event.message
+        chat_id = message.chat.id if message is not None else None
+        message_id = message.message_id if message is not None else None
+        if not await update_dedup.claim(event.update_id, chat_id, message_id):
+            await logger.log(
+                level="INFO",
+                module=__name__,
+                message=f"Повторний update {event.update_id} пропущено",
+            )
+            return None
+        return await handler(event, data)
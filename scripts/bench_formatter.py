@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк formatters.tg_formatter: попередня реалізація (шість regex-проходів +
+str.replace на кожен плейсхолдер) проти однопрохідної, на великих синтетичних відповідях.
+
+Запуск з кореня репозиторію: python scripts/bench_formatter.py [--repeat 5]
+"""
+import argparse
+import html
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from formatters.tg_formatter import format_for_telegram  # noqa: E402
+
+# --- Попередня реалізація (для порівняння) ---
+
+_CODE_BLOCK_RE = re.compile(r"```(?:\w+)?\n?([\s\S]*?)```", re.MULTILINE)
+_INLINE_CODE_RE = re.compile(r"`([^`]+)`")
+_BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+_BOLD_UNDER_RE = re.compile(r"__(.+?)__")
+_ITALIC_RE = re.compile(r"\*([^*]+)\*")
+_ITALIC_UNDER_RE = re.compile(r"(?<![_])_([^_]+)_(?![_])")
+
+
+def _placeholder(prefix: str, i: int) -> str:
+    return f"\x00{prefix}{i}\x00"
+
+
+def format_legacy(text: str) -> Tuple[str, str]:
+    if not text or not text.strip():
+        return "", "HTML"
+    raw = text.strip()
+    blocks: list = []
+
+    def block_repl(m: re.Match) -> str:
+        blocks.append(m.group(1))
+        return _placeholder("B", len(blocks) - 1)
+
+    s = _CODE_BLOCK_RE.sub(block_repl, raw)
+    inlines: list = []
+
+    def inline_repl(m: re.Match) -> str:
+        inlines.append(m.group(1))
+        return _placeholder("I", len(inlines) - 1)
+
+    s = _INLINE_CODE_RE.sub(inline_repl, s)
+    s = html.escape(s)
+    s = _BOLD_RE.sub(r"<b>\1</b>", s)
+    s = _BOLD_UNDER_RE.sub(r"<b>\1</b>", s)
+    s = _ITALIC_RE.sub(r"<i>\1</i>", s)
+    s = _ITALIC_UNDER_RE.sub(r"<i>\1</i>", s)
+    for i, content in enumerate(blocks):
+        s = s.replace(_placeholder("B", i), f"<pre><code>{html.escape(content)}</code></pre>")
+    for i, content in enumerate(inlines):
+        s = s.replace(_placeholder("I", i), f"<code>{html.escape(content)}</code>")
+    return s.strip(), "HTML"
+
+
+# --- Синтетичні відповіді ---
+
+_WORDS = "the model returns a value when called with <args> & options for each item".split()
+
+
+def _prose(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def reply_prose(rng: random.Random, size: int) -> str:
+    """Звичайний текст з абзацами, жирним і курсивом."""
+    parts = []
+    while sum(map(len, parts)) < size:
+        parts.append(f"{_prose(rng, 30)} **{_prose(rng, 2)}** {_prose(rng, 20)} *{_prose(rng, 2)}*.\n\n")
+    return "".join(parts)
+
+
+def reply_inline_code(rng: random.Random, size: int) -> str:
+    """Багато inline-коду — найгірший випадок для str.replace на кожен плейсхолдер."""
+    parts = []
+    while sum(map(len, parts)) < size:
+        parts.append(f"call `fn_{rng.randint(0, 999)}(x)` then `obj.attr` and ")
+    return "".join(parts)
+
+
+def reply_code_blocks(rng: random.Random, size: int) -> str:
+    """Чергування тексту і блоків коду."""
+    parts = []
+    while sum(map(len, parts)) < size:
+        code = "\n".join(f"    x_{i} = y[{i}] < {i} and z" for i in range(8))
+        parts.append(f"{_prose(rng, 25)}\n```python\n{code}\n```\n")
+    return "".join(parts)
+
+
+def reply_mixed(rng: random.Random, size: int) -> str:
+    """Списки, посилання, inline-код, блоки — як типова довга відповідь."""
+    parts = []
+    while sum(map(len, parts)) < size:
+        parts.append(
+            f"- **{_prose(rng, 2)}**: `{_prose(rng, 1)}` {_prose(rng, 12)}\n"
+            f"- see [docs](https://example.com/p?id={rng.randint(0, 99)}) _{_prose(rng, 3)}_\n"
+        )
+        if rng.random() < 0.2:
+            parts.append("```\nfor item in items:\n    print(item)\n```\n")
+    return "".join(parts)
+
+
+CASES = {
+    "prose": reply_prose,
+    "inline_code": reply_inline_code,
+    "code_blocks": reply_code_blocks,
+    "mixed": reply_mixed,
+}
+SIZES = (4_000, 40_000, 200_000)
+
+
+def _best_ms(fn: Callable[[str], Tuple[str, str]], text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="скільки запусків (береться найкращий)")
+    args = parser.parse_args()
+
+    print(f"{'case':<12} {'chars':>8} {'legacy ms':>10} {'new ms':>10} {'speedup':>8}")
+    for name, make in CASES.items():
+        for size in SIZES:
+            text = make(random.Random(size), size)
+            legacy = _best_ms(format_legacy, text, args.repeat)
+            new = _best_ms(format_for_telegram, text, args.repeat)
+            print(f"{name:<12} {len(text):>8} {legacy:>10.3f} {new:>10.3f} {legacy / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
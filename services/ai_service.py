@@ -1,49 +1,178 @@
 """
 AI-сервіс для генерації відповідей.
 
-Якщо OPENAI_API_KEY немає → mock. Якщо є → (пізніше) справжній виклик.
+Якщо OPENAI_API_KEY немає → mock. Якщо є → виклик OpenAI (звичайний або stream).
+Кожен запит до OpenAI проходить через llm_scheduler (черга, RPM/TPM, round-robin по user_key).
+
+Порядок prompt — від найстабільнішого до найзміннішого (_build_prompt): tools (payload
+з реєстру, незмінний за процес), system prompt, summary, історія, нове повідомлення.
+Так спільний префікс сусідніх ходів побайтово однаковий і OpenAI віддає його з prompt
+cache. Фактичний usage (prompt / cached / completion) — у llm_usage.
 """
 
 from __future__ import annotations
 
-from functools import lru_cache
 import json
-from pathlib import Path
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Hashable, Optional
 
 from config import settings
 from logger import logger
-from tools.registry import get_tool_handler
+from tools.executor import execute_tool_calls
 from . import openai_client
+from .llm_scheduler import Ticket, estimate_tokens, llm_scheduler
+from .llm_usage import LLMUsage, usage_from_response, usage_stats
+from .prompt_store import DEFAULT_SYSTEM_PROMPT, prompt_store
+from .response_cache import make_key, response_cache
 
 
-@lru_cache(maxsize=1)
 def _load_system_prompt() -> str:
     """
-    Завантажує системний промпт з файлу.
+    Системний промпт за замовчуванням (prompts/system_prompt.txt, services/prompt_store.py).
 
     Чому окремий файл: так легше підтримувати промпт, робити ревʼю та версіонувати
-    без правок у коді сервісу.
+    без правок у коді сервісу; зміни підхоплюються без рестарту.
     """
-    prompt_path = Path(__file__).resolve().parents[1] / "prompts" / "system_prompt.txt"
-    try:
-        return prompt_path.read_text(encoding="utf-8").strip()
-    except FileNotFoundError:
+    prompt = prompt_store.get(DEFAULT_SYSTEM_PROMPT)
+    if prompt is None:
         # Безпечний fallback, щоб бот не падав якщо файл випадково видалили
-        return (
-            "You are a helpful AI assistant in a Telegram bot. Be concise and honest."
-        )
+        return "You are a helpful AI assistant in a Telegram bot. Be concise and honest."
+    return prompt.text
+
+
+def _load_summary_prompt() -> str:
+    """Інструкція для оновлення стислого змісту розмови (services/summarizer.py)."""
+    prompt = prompt_store.get("summary_prompt")
+    if prompt is None:
+        return "Update the running summary of the conversation. Be brief. Return only the summary."
+    return prompt.text
 
 
-def _ensure_system_message(messages: list[dict]) -> list[dict]:
-    """Якщо немає system — додає на початок."""
+def _build_prompt(
+    messages: list[dict], summary: Optional[str] = None, system_prompt: Optional[str] = None
+) -> list[dict]:
+    """
+    System prompt (якщо caller не передав свій) → summary окремим system-повідомленням →
+    історія. Summary змінюється раз на SUMMARY_EVERY_MESSAGES, тому стоїть після system:
+    його оновлення не скидає кеш system prompt і tools.
+
+    system_prompt — текст, вибраний для чату (prompt_store.select); None — за замовчуванням.
+    """
     if messages and messages[0].get("role") == "system":
-        return messages
-    return [{"role": "system", "content": _load_system_prompt()}] + list(messages)
+        head, rest = [messages[0]], list(messages[1:])
+    else:
+        system = system_prompt if system_prompt is not None else _load_system_prompt()
+        head, rest = [{"role": "system", "content": system}], list(messages)
+    if summary:
+        head.append(
+            {"role": "system", "content": f"Стислий зміст попередньої частини розмови:\n{summary}"}
+        )
+    return head + rest
+
+
+def _mock_reply(messages: list[dict[str, str]]) -> str:
+    last_user = next((m for m in reversed(messages) if m.get("role") == "user"), messages[-1])
+    content = last_user.get("content", "")[:200] if isinstance(last_user.get("content"), str) else ""
+    return (
+        "(mock)\n"
+        f"You said: {content}\n\n"
+        "To enable real AI replies, set OPENAI_API_KEY and implement the OpenAI call."
+    )
+
+
+async def _get_client_or_log() -> Any:
+    client = openai_client.get_client(settings.OPENAI_API_KEY)
+    if client is None:
+        await logger.log(
+            level="ERROR",
+            module=__name__,
+            message=f"OpenAI SDK import failed: {openai_client.get_import_error()}",
+        )
+    return client
+
+
+async def _execute_tool_calls(
+    messages: list[dict], tool_calls: list[dict[str, str]], content: str = ""
+) -> None:
+    """
+    Виконує tool calls моделі і дописує в messages assistant-повідомлення з tool_calls
+    та по одному tool-повідомленню з результатом (формат OpenAI messages).
+
+    tool_calls: [{"id", "name", "arguments"}] — однаково для звичайної і stream-відповіді.
+    """
+    messages.append(
+        {
+            "role": "assistant",
+            "content": content,
+            "tool_calls": [
+                {
+                    "id": tc["id"],
+                    "type": "function",
+                    "function": {"name": tc["name"], "arguments": tc["arguments"]},
+                }
+                for tc in tool_calls
+            ],
+        }
+    )
+
+    calls: list[tuple[str, dict[str, Any]]] = []
+    for tc in tool_calls:
+        try:
+            args = json.loads(tc["arguments"] or "{}")
+        except Exception:
+            args = {}
+        calls.append((tc["name"], args if isinstance(args, dict) else {}))
+
+    # Усі tool calls одного ходу — конкурентно (tools/executor.py)
+    results = await execute_tool_calls(calls)
+    for tc, result in zip(tool_calls, results):
+        messages.append(
+            {
+                "role": "tool",
+                "tool_call_id": tc["id"],
+                "content": result,
+            }
+        )
+
+
+def _record_usage(
+    ticket: Ticket, raw_usage: Any, usage: Optional[LLMUsage], purpose: str
+) -> None:
+    """Фактичний usage виклику → TPM bucket, метрики і (якщо передано) usage ходу."""
+    call_usage = usage_from_response(raw_usage)
+    if call_usage is None:
+        return
+    ticket.report_usage(call_usage.total_tokens)
+    usage_stats.record(purpose, call_usage)
+    if usage is not None:
+        usage.add(call_usage)
+
+
+async def _create_completion(
+    client: Any,
+    messages: list[dict],
+    tool_defs: Optional[list[dict[str, Any]]],
+    user_key: Hashable,
+    usage: Optional[LLMUsage] = None,
+    purpose: str = "reply",
+    **params: Any,
+) -> Any:
+    """chat.completions.create у слоті планувальника; фактичний usage — у TPM bucket і метрики."""
+    async with llm_scheduler.slot(user_key, estimate_tokens(messages, tool_defs)) as ticket:
+        response = await client.chat.completions.create(
+            model=settings.OPENAI_MODEL,
+            messages=messages,
+            tools=tool_defs,
+            **params,
+        )
+        _record_usage(ticket, getattr(response, "usage", None), usage, purpose)
+    return response
 
 
 async def _call_llm(
-    messages: list[dict[str, str]], tools: Optional[list[dict[str, Any]]]
+    messages: list[dict[str, str]],
+    tools: Optional[list[dict[str, Any]]],
+    user_key: Hashable = None,
+    usage: Optional[LLMUsage] = None,
 ) -> str:
     """
     Шар 2: виклик LLM.
@@ -56,103 +185,220 @@ async def _call_llm(
             module=__name__,
             message="Using mock reply (no OPENAI_API_KEY)",
         )
-        last_user = next((m for m in reversed(messages) if m.get("role") == "user"), messages[-1])
-        content = last_user.get("content", "")[:200] if isinstance(last_user.get("content"), str) else ""
-        return (
-            "(mock)\n"
-            f"You said: {content}\n\n"
-            "To enable real AI replies, set OPENAI_API_KEY and implement the OpenAI call."
-        )
+        return _mock_reply(messages)
 
-    client = openai_client.get_client(settings.OPENAI_API_KEY)
+    client = await _get_client_or_log()
     if client is None:
-        await logger.log(
-            level="ERROR",
-            module=__name__,
-            message=f"OpenAI SDK import failed: {openai_client.get_import_error()}",
-        )
         return "(error) OpenAI SDK is not installed. Install `openai` package."
 
     tool_defs = tools if tools else None
 
-    response = await client.chat.completions.create(
-        model=settings.OPENAI_MODEL,
-        messages=messages,
-        tools=tool_defs,
-    )
+    response = await _create_completion(client, messages, tool_defs, user_key, usage)
 
     msg = response.choices[0].message
 
     # Якщо модель викликає tools — виконуємо їх і робимо ще один запит
     tool_calls = getattr(msg, "tool_calls", None)
     if tool_calls:
-        # Додаємо assistant message з tool_calls (формат OpenAI messages)
-        messages.append(
-            {
-                "role": "assistant",
-                "content": msg.content or "",
-                "tool_calls": [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments,
-                        },
-                    }
-                    for tc in tool_calls
-                ],
-            }
+        await _execute_tool_calls(
+            messages,
+            [
+                {"id": tc.id, "name": tc.function.name, "arguments": tc.function.arguments}
+                for tc in tool_calls
+            ],
+            content=msg.content or "",
         )
 
-        for tc in tool_calls:
-            name = tc.function.name
-            raw_args = tc.function.arguments or "{}"
-            try:
-                args = json.loads(raw_args)
-            except Exception:
-                args = {}
-
-            tool = get_tool_handler(name)
-            if not tool:
-                result = f"Tool '{name}' is not registered."
-            else:
-                try:
-                    result = tool.handler(**args)
-                except Exception as e:  # pragma: no cover
-                    result = f"Tool '{name}' failed: {e}"
-
-            messages.append(
-                {
-                    "role": "tool",
-                    "tool_call_id": tc.id,
-                    "content": result,
-                }
+        response2 = await _create_completion(client, messages, tool_defs, user_key, usage)
+        return (response2.choices[0].message.content or "").strip()
+
+    return (msg.content or "").strip()
+
+
+async def _stream_llm(
+    messages: list[dict[str, str]],
+    tools: Optional[list[dict[str, Any]]],
+    user_key: Hashable = None,
+    usage: Optional[LLMUsage] = None,
+) -> AsyncIterator[str]:
+    """
+    Stream-варіант _call_llm: віддає шматки тексту відповіді в міру генерації.
+    Слот планувальника тримається, поки читається stream. Usage приходить останнім
+    chunk (stream_options include_usage) — без choices.
+
+    Tool calls у stream приходять фрагментами (по index) — збираємо їх, виконуємо
+    і стрімимо вже другий запит.
+    """
+    if not settings.OPENAI_API_KEY:
+        await logger.log(
+            level="DEBUG",
+            module=__name__,
+            message="Using mock reply (no OPENAI_API_KEY)",
+        )
+        # Імітуємо stream, щоб mock проходив той самий шлях у handler
+        reply = _mock_reply(messages)
+        for i in range(0, len(reply), 40):
+            yield reply[i : i + 40]
+        return
+
+    client = await _get_client_or_log()
+    if client is None:
+        yield "(error) OpenAI SDK is not installed. Install `openai` package."
+        return
+
+    tool_defs = tools if tools else None
+
+    for attempt in range(2):
+        async with llm_scheduler.slot(user_key, estimate_tokens(messages, tool_defs)) as ticket:
+            stream = await client.chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=messages,
+                tools=tool_defs,
+                stream=True,
+                stream_options={"include_usage": True},
             )
+            calls: dict[int, dict[str, str]] = {}
+            # Текст, який модель встигла віддати до tool calls, — частина її assistant-повідомлення
+            streamed_parts: list[str] = []
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    _record_usage(ticket, chunk.usage, usage, "reply")
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    streamed_parts.append(delta.content)
+                    yield delta.content
+                for tc in delta.tool_calls or []:
+                    acc = calls.setdefault(tc.index, {"id": "", "name": "", "arguments": ""})
+                    if tc.id:
+                        acc["id"] = tc.id
+                    if tc.function is not None:
+                        acc["name"] += tc.function.name or ""
+                        acc["arguments"] += tc.function.arguments or ""
 
-        response2 = await client.chat.completions.create(
-            model=settings.OPENAI_MODEL,
-            messages=messages,
-            tools=tool_defs,
+        # Другий прохід лише якщо були tool calls (як у _call_llm — один раунд tools)
+        if not calls or attempt == 1:
+            return
+        await _execute_tool_calls(
+            messages, [calls[i] for i in sorted(calls)], content="".join(streamed_parts)
         )
-        return (response2.choices[0].message.content or "").strip()
 
-    return (msg.content or "").strip()
+
+def _response_cache_enabled() -> bool:
+    # Mock-відповіді не кешуємо — вони й так миттєві
+    return settings.RESPONSE_CACHE_ENABLED and bool(settings.OPENAI_API_KEY)
 
 
 async def generate_reply(
     messages: list[dict],
     tools: Optional[list[dict[str, Any]]] = None,
+    user_key: Hashable = None,
+    summary: Optional[str] = None,
+    usage: Optional[LLMUsage] = None,
+    system_prompt: Optional[str] = None,
 ) -> str:
     """
     Генерує відповідь по історії повідомлень.
 
+    При RESPONSE_CACHE_ENABLED однаковий prompt (model + messages + tools) віддається
+    з кешу без виклику моделі (services/response_cache.py).
+
     Args:
         messages: список {"role": "user"|"assistant"|"system", "content": "..."}
         tools: список tools для function calling (опціонально)
+        user_key: хто питає (telegram_id) — для чесної черги в llm_scheduler
+        summary: стислий зміст старішої частини розмови (Conversation.summary)
+        usage: сюди додається фактичний usage усіх викликів (None — лише метрики)
+        system_prompt: system prompt, вибраний для чату (None — prompts/system_prompt.txt)
 
     Returns:
         Згенерована відповідь
     """
-    messages = _ensure_system_message(messages)
-    return await _call_llm(messages, tools)
+    messages = _build_prompt(messages, summary, system_prompt)
+    if not _response_cache_enabled():
+        return await _call_llm(messages, tools, user_key, usage)
+
+    key = make_key(settings.OPENAI_MODEL, messages, tools)
+    cached = await response_cache.get(key)
+    if cached is not None:
+        return cached
+
+    n_before = len(messages)
+    reply = await _call_llm(messages, tools, user_key, usage)
+    # _call_llm дописує в messages tool calls і результати — такі відповіді не кешуємо
+    if len(messages) != n_before:
+        response_cache.bypass()
+    else:
+        await response_cache.set(key, reply)
+    return reply
+
+
+async def generate_reply_stream(
+    messages: list[dict],
+    tools: Optional[list[dict[str, Any]]] = None,
+    user_key: Hashable = None,
+    summary: Optional[str] = None,
+    usage: Optional[LLMUsage] = None,
+    system_prompt: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    Як generate_reply, але віддає відповідь шматками (stream=True).
+    Повний текст = конкатенація всіх шматків. Відповідь з кешу віддається одним шматком.
+    """
+    messages = _build_prompt(messages, summary, system_prompt)
+    if not _response_cache_enabled():
+        async for delta in _stream_llm(messages, tools, user_key, usage):
+            yield delta
+        return
+
+    key = make_key(settings.OPENAI_MODEL, messages, tools)
+    cached = await response_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    n_before = len(messages)
+    parts: list[str] = []
+    async for delta in _stream_llm(messages, tools, user_key, usage):
+        parts.append(delta)
+        yield delta
+    if len(messages) != n_before:
+        response_cache.bypass()
+    else:
+        await response_cache.set(key, "".join(parts).strip())
+
+
+async def generate_summary(
+    previous: Optional[str], messages: list[dict[str, str]], user_key: Hashable
+) -> Optional[str]:
+    """
+    Оновлений стислий зміст: попередній summary + нові повідомлення → новий summary.
+    None — без OPENAI_API_KEY (mock-зміст у prompt не потрібен) або порожня відповідь.
+    """
+    if not settings.OPENAI_API_KEY:
+        return None
+    client = await _get_client_or_log()
+    if client is None:
+        return None
+
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = [
+        {"role": "system", "content": _load_summary_prompt()},
+        {
+            "role": "user",
+            "content": (
+                f"Попередній зміст:\n{previous or '(порожньо)'}\n\n"
+                f"Нові повідомлення:\n{transcript}"
+            ),
+        },
+    ]
+    response = await _create_completion(
+        client,
+        prompt,
+        None,
+        user_key,
+        purpose="summary",
+        max_tokens=settings.SUMMARY_MAX_TOKENS,
+    )
+    return (response.choices[0].message.content or "").strip() or None
@@ -0,0 +1,141 @@
+"""
+Per-chat диспетчер: серіалізація обробки і склеювання повідомлень, що йдуть поспіль.
+
+Для кожного ключа (чат, користувач) — своя черга і один worker, тож два повідомлення одного
+чату ніколи не обробляються паралельно (немає гонок за історію і rollover). Worker
+чекає debounce-вікно після останнього повідомлення і віддає в process() усі накопичені
+разом — один виклик LLM і одна відповідь замість кількох.
+
+Прийнятих, але ще не оброблених повідомлень — не більше max_pending на всі ключі:
+коли ліміт досягнуто, submit() чекає. Так handler тримає свій слот (WEBHOOK_MAX_IN_FLIGHT,
+черга воркера supervisor) і backpressure доходить до Telegram, а не копиться в памʼяті.
+
+Без залежності від aiogram: item — будь-який обʼєкт, process(key, items) задає handler.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import traceback
+from typing import Awaitable, Callable, Generic, Hashable, Optional, TypeVar
+
+from logger import logger
+
+T = TypeVar("T")
+
+# Скільки секунд worker чату живе без повідомлень, перш ніж завершитись
+_WORKER_IDLE_SEC = 60.0
+
+
+class ChatDispatcher(Generic[T]):
+    """Черга + worker на ключ; batch у межах debounce-вікна."""
+
+    def __init__(
+        self,
+        process: Callable[[Hashable, list[T]], Awaitable[None]],
+        debounce: float,
+        max_batch: int,
+        max_pending: int,
+    ):
+        self.process = process
+        self.debounce = debounce
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        # Слот на кожне прийняте повідомлення; звільняється після його обробки
+        self._pending: Optional[asyncio.Semaphore] = None
+        self._queues: dict[Hashable, asyncio.Queue] = {}
+        self._workers: dict[Hashable, asyncio.Task] = {}
+        # Ключі, чиї workers зараз чекають першого повідомлення (нічого не обробляють)
+        self._idle: set[Hashable] = set()
+        self._closing = False
+        self.coalesced = 0
+        self.waiting_submit = 0
+
+    async def submit(self, key: Hashable, item: T) -> None:
+        """Поставити item у чергу ключа. Не чекає обробки — лише вільного місця (max_pending)."""
+        if self._closing:
+            return
+        if self.max_pending > 0:
+            if self._pending is None:
+                self._pending = asyncio.Semaphore(self.max_pending)
+            self.waiting_submit += 1
+            try:
+                await self._pending.acquire()
+            finally:
+                self.waiting_submit -= 1
+            if self._closing:
+                self._pending.release()
+                return
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = asyncio.Queue()
+        queue.put_nowait(item)
+        if key not in self._workers:
+            self._workers[key] = asyncio.get_running_loop().create_task(self._worker(key, queue))
+
+    async def _worker(self, key: Hashable, queue: asyncio.Queue) -> None:
+        try:
+            while True:
+                self._idle.add(key)
+                try:
+                    first = await asyncio.wait_for(queue.get(), timeout=_WORKER_IDLE_SEC)
+                except asyncio.TimeoutError:
+                    # Між перевіркою і видаленням немає await — submit не загубиться
+                    if queue.empty():
+                        return
+                    continue
+                finally:
+                    self._idle.discard(key)
+
+                batch = [first]
+                while len(batch) < self.max_batch and self.debounce > 0:
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout=self.debounce))
+                    except asyncio.TimeoutError:
+                        break
+                # Те, що вже лежить у черзі, теж забираємо — воно прийшло до відповіді
+                while len(batch) < self.max_batch and not queue.empty():
+                    batch.append(queue.get_nowait())
+                self.coalesced += len(batch) - 1
+
+                try:
+                    await self.process(key, batch)
+                except Exception as e:
+                    await logger.log(
+                        level="ERROR",
+                        module=__name__,
+                        message=f"Обробка чату {key} впала: {e}\n{traceback.format_exc()}",
+                    )
+                finally:
+                    self._release(len(batch))
+                if self._closing and queue.empty():
+                    return
+        finally:
+            self._idle.discard(key)
+            self._workers.pop(key, None)
+            if self._queues.get(key) is queue and queue.empty():
+                del self._queues[key]
+
+    def _release(self, count: int) -> None:
+        if self._pending is not None:
+            for _ in range(count):
+                self._pending.release()
+
+    async def close(self, timeout: float = 30.0) -> None:
+        """Не приймати нових; дочекатися обробки вже прийнятих (з таймаутом)."""
+        self._closing = True
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        # Workers, що чекають нових повідомлень, більше нічого не отримають — скасовуємо їх
+        for key in list(self._idle):
+            self._workers[key].cancel()
+        await asyncio.wait(workers, timeout=timeout)
+
+    def stats(self) -> dict:
+        return {
+            "active_chats": len(self._workers),
+            "queued": sum(q.qsize() for q in self._queues.values()),
+            "coalesced": self.coalesced,
+            "waiting_submit": self.waiting_submit,
+        }
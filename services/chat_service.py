@@ -2,33 +2,125 @@
 ChatService — оркестрація діалогу, БД, AI.
 
 Отримує/створює user, conversation, зберігає історію, передає в AI.
+
+run_chat_turn / stream_chat_turn — хід діалогу у двох коротких транзакціях:
+(1) user/conversation + user msg, (2) assistant msg. Під час LLM і tools зʼєднання
+з БД не тримається, тож конкурентність бота не обмежена розміром пулу.
 """
 
 from __future__ import annotations
 
+import asyncio
 import traceback
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Iterable, Optional
 
-from sqlalchemy import desc, func, select
+from sqlalchemy import and_, desc, func, select, true, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
+from config import settings
+from db import (
+    LOCK_NS_CHAT_TURN,
+    LOCK_NS_IDENTITY,
+    UnitOfWork,
+    advisory_session_lock,
+    advisory_xact_lock,
+    on_commit,
+)
 from db.models import Conversation, Message, User
 from logger import logger
-from services.ai_service import generate_reply
+from services import identity_cache
+from services.ai_service import generate_reply, generate_reply_stream
+from services.history_buffer import HistoryBuffer, HistoryItem
+from services.identity_cache import CachedIdentity
+from services.llm_scheduler import LLMQueueTimeout
+from services.llm_usage import LLMUsage
+from services.message_writer import MessageWriteBehind, PendingMessage, usage_columns
+from services.prompt_store import Prompt, prompt_store
+from services.summarizer import summarizer
+from services.tokenizer import MESSAGE_OVERHEAD_TOKENS, context_budget, count_tokens
 from tools.registry import get_tools
 
-# Скільки останніх повідомлень передавати в AI як контекст
-LAST_N_MESSAGES = 12
+# Скільки останніх повідомлень максимум читати з БД / тримати в буфері: CONTEXT_MAX_MESSAGES
+# і запас на вирівнювання початку вікна (CONTEXT_WINDOW_STEP). Скільки з них піде в AI —
+# вирішують ліміт і бюджет токенів (_pack_history)
+LAST_N_MESSAGES = settings.CONTEXT_MAX_MESSAGES + max(settings.CONTEXT_WINDOW_STEP - 1, 0)
 # Після цієї кількості — закрити conversation, створити нову, оновити user.active_conversation_id
 MAX_MESSAGES_PER_CONVERSATION = 200
 # Текст користувачу при помилці AI (лог з stacktrace окремо)
 AI_ERROR_FALLBACK = "Сталася помилка, спробуй ще раз."
+# Текст користувачу, коли запит не дочекався черги до LLM (llm_scheduler)
+AI_BUSY_FALLBACK = "Зараз забагато запитів, спробуй за хвилину."
+# Скільки разів пробувати зберегти відповідь (транзакція 2) і пауза між спробами
+SAVE_REPLY_ATTEMPTS = 2
+SAVE_REPLY_RETRY_DELAY_SEC = 0.5
+
+# Останні LAST_N_MESSAGES повідомлень активних розмов у памʼяті процесу
+history_buffer = HistoryBuffer(
+    max_messages=LAST_N_MESSAGES,
+    max_total_chars=settings.HISTORY_BUFFER_MAX_CHARS,
+    idle_ttl=settings.HISTORY_BUFFER_IDLE_TTL_SEC,
+)
+
+
+def _append_flushed_to_history(batch: list[PendingMessage]) -> None:
+    for item in batch:
+        history_buffer.append(item.conversation_id, item.role, item.content, item.token_count or 0)
+
+
+# Write-behind: INSERT повідомлень пачками (None — кожен хід пише сам, у своїй транзакції)
+message_writer: Optional[MessageWriteBehind] = (
+    MessageWriteBehind(
+        flush_interval=settings.MESSAGE_FLUSH_INTERVAL_MS / 1000,
+        batch_size=settings.MESSAGE_FLUSH_BATCH_SIZE,
+        wait_for_flush=settings.MESSAGE_WRITE_DURABILITY == "ack",
+        on_flushed=_append_flushed_to_history,
+    )
+    if settings.MESSAGE_WRITE_BEHIND
+    else None
+)
+
+
+@dataclass
+class ChatTurn:
+    """Результат транзакції 1: усе, що потрібно для виклику LLM і збереження відповіді."""
+
+    conversation_id: int
+    messages_for_ai: list[dict[str, str]]
+    tool_names: Optional[frozenset[str]] = None
+    user_text: str = ""
+    # True — user msg ще не записаний (write-behind): message_count вже враховано, INSERT — у writer
+    user_message_pending: bool = False
+    # telegram_id — ключ чесної черги в llm_scheduler
+    user_key: Optional[int] = None
+    user_tokens: int = 0
+    # message_count розмови після user msg; summary — стислий зміст старішої частини
+    message_count: int = 0
+    summary: Optional[str] = None
+    # Фактичний usage LLM за хід — пишеться в assistant msg
+    usage: LLMUsage = field(default_factory=LLMUsage)
+    # System prompt, вибраний для чату на початку ходу; версія — в обох повідомленнях ходу
+    prompt: Optional[Prompt] = None
+
+    @property
+    def prompt_version(self) -> Optional[str]:
+        return self.prompt.version if self.prompt is not None else None
+
+    @property
+    def system_prompt(self) -> Optional[str]:
+        return self.prompt.text if self.prompt is not None else None
 
 
 class ChatService:
     """Сервіс для роботи з діалогами (user, conversation, messages, AI)."""
 
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, tool_names: Optional[Iterable[str]] = None):
+        """tool_names — підмножина tools для цієї розмови; None — усі зареєстровані."""
         self.session = session
+        self.tool_names = None if tool_names is None else frozenset(tool_names)
 
     async def ensure_user_and_conversation(
         self, telegram_id: int, username: str | None
@@ -37,66 +129,266 @@ class ChatService:
         При /start: створити/оновити User, створити активну Conversation якщо немає,
         проставити user.active_conversation_id. Без повідомлень.
         """
+        await advisory_xact_lock(self.session, LOCK_NS_IDENTITY, telegram_id)
         user = await self._get_or_create_user(telegram_id, username)
-        await self._get_or_create_active_conversation(user)
+        conversation = await self._get_or_create_active_conversation(user)
+        self._cache_identity_on_commit(telegram_id, user, conversation)
 
-    async def process_message(
-        self,
-        telegram_id: int,
-        username: str | None,
-        user_text: str,
-    ) -> str:
+    async def start_turn(
+        self, telegram_id: int, username: str | None, user_text: str
+    ) -> ChatTurn:
+        """Транзакція 1: user/conversation → історія → зберегти user msg."""
+        turn = ChatTurn(
+            conversation_id=0,
+            messages_for_ai=[],
+            tool_names=self.tool_names,
+            user_text=user_text,
+            user_message_pending=message_writer is not None,
+            user_key=telegram_id,
+            user_tokens=count_tokens(user_text),
+            prompt=prompt_store.select(telegram_id),
+        )
+        await self._prepare_turn(turn, telegram_id, username)
+        return turn
+
+    async def complete_turn(self, turn: ChatTurn, raw_reply: str) -> None:
         """
-        Повний цикл: user/conversation → історія → зберегти user msg → AI → зберегти assistant.
+        Транзакція 2: зберегти assistant msg. Conversation не завантажуємо —
+        лічильник збільшується атомарним UPDATE. У write-behind режимі — через writer.
         """
-        user = await self._get_or_create_user(telegram_id, username)
-        conversation = await self._get_or_create_active_conversation(user)
+        tokens = count_tokens(raw_reply)
+        if message_writer is not None:
+            await message_writer.submit(
+                turn.conversation_id,
+                "assistant",
+                raw_reply,
+                token_count=tokens,
+                usage=turn.usage,
+                prompt_version=turn.prompt_version,
+            )
+            return
+        self.session.add(
+            Message(
+                conversation_id=turn.conversation_id,
+                role="assistant",
+                content=raw_reply,
+                token_count=tokens,
+                prompt_version=turn.prompt_version,
+                **usage_columns(turn.usage),
+            )
+        )
+        await self.session.execute(
+            update(Conversation)
+            .where(Conversation.id == turn.conversation_id)
+            .values(message_count=Conversation.message_count + 1)
+        )
+        self._buffer_on_commit(turn.conversation_id, "assistant", raw_reply, tokens)
+
+    async def _prepare_turn(
+        self, turn: ChatTurn, telegram_id: int, username: str | None
+    ) -> None:
+        """
+        User/conversation → історія → зберегти user msg. Заповнює conversation_id,
+        message_count, summary і messages для AI у turn.
+
+        Швидкий шлях: ids з identity_cache — без advisory lock і без читання users.
+        Запитів до БД: claim (UPDATE ... RETURNING) + історія з history_buffer; на промах
+        буфера — ще SELECT історії, тобто стільки ж, скільки в повному шляху (lock +
+        _load_context). Менше запитів він дає лише при влученні в буфер
+        (history_buffer.stats()["hit_rate"]).
+
+        Історію не читаємо в тому ж запиті, що й claim (CTE з UPDATE): увесь запит бачить
+        snapshot від свого початку, і якщо UPDATE чекав row lock (writer, хід з іншої
+        репліки), щойно закомічені повідомлення в історію не потрапили б.
+        """
+        cached = identity_cache.get(telegram_id)
+        if cached is not None and (username is None or username == cached.username):
+            claimed = await self._claim_message_slot(cached.conversation_id)
+            if claimed is not None:
+                turn.conversation_id = cached.conversation_id
+                turn.message_count, turn.summary = claimed
+                # message_count уже враховує нове повідомлення — у БД до нього на одне менше
+                history = await self._get_history(
+                    cached.conversation_id, turn.message_count - 1
+                )
+                turn.messages_for_ai = self._add_user_message(turn, history)
+                return
+            # Розмова закрита/заповнена (rollover) — повний шлях нижче оновить кеш
+            identity_cache.invalidate(telegram_id)
+
+        # Повний шлях може створювати user/conversation або робити rollover — серіалізуємо
+        # його між процесами і репліками (до commit транзакції 1)
+        await advisory_xact_lock(self.session, LOCK_NS_IDENTITY, telegram_id)
+        user, conversation, messages_db = await self._load_context(telegram_id, n=LAST_N_MESSAGES)
+        if user is None:
+            user = await self._get_or_create_user(telegram_id, username)
+        elif username is not None and user.username != username:
+            user.username = username
 
-        messages_db = await self._get_last_messages(conversation.id, n=LAST_N_MESSAGES)
+        if conversation is None:
+            # Рідкісний шлях: нового user або active_conversation_id не вказує на активну гілку
+            conversation = await self._get_or_create_active_conversation(user)
+            history = []
+            if conversation.message_count:
+                history = await self._get_history(conversation.id, conversation.message_count)
+        else:
+            rolled = await self._rollover_if_full(user, conversation)
+            if rolled is not conversation:
+                conversation, messages_db = rolled, []
+            history = [_history_item(m) for m in messages_db]
+        history_buffer.fill(conversation.id, history, conversation.message_count)
 
-        user_msg = Message(
-            conversation_id=conversation.id,
-            role="user",
-            content=user_text,
+        # Атомарний +1, як у _claim_message_slot: запис значення, прочитаного раніше в цій
+        # транзакції, загубив би інкремент швидкого шляху, закомічений між читанням і flush
+        await self.session.flush()
+        result = await self.session.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation.id)
+            .values(message_count=Conversation.message_count + 1)
+            .returning(Conversation.message_count)
+            .execution_options(synchronize_session=False)
         )
-        self.session.add(user_msg)
+        turn.conversation_id = conversation.id
+        turn.message_count = result.scalar_one()
+        turn.summary = conversation.summary
+        turn.messages_for_ai = self._add_user_message(turn, history)
         await self.session.flush()
+        self._cache_identity_on_commit(telegram_id, user, conversation)
 
+    def _add_user_message(
+        self, turn: ChatTurn, history: list[HistoryItem]
+    ) -> list[dict[str, str]]:
+        """
+        Додає user msg у сесію і повертає messages для AI (історія в межах бюджету + нове повідомлення).
+        Summary теж займає бюджет. У write-behind режимі INSERT робить writer після commit
+        (див. _persist_user_message).
+        """
+        if message_writer is None:
+            self.session.add(
+                Message(
+                    conversation_id=turn.conversation_id,
+                    role="user",
+                    content=turn.user_text,
+                    token_count=turn.user_tokens,
+                    prompt_version=turn.prompt_version,
+                )
+            )
+            self._buffer_on_commit(
+                turn.conversation_id, "user", turn.user_text, turn.user_tokens
+            )
+        budget = context_budget() - turn.user_tokens - MESSAGE_OVERHEAD_TOKENS
+        if turn.summary:
+            budget -= count_tokens(turn.summary) + MESSAGE_OVERHEAD_TOKENS
+        # Номер першого повідомлення history у розмові (message_count уже враховує нове)
+        first_index = turn.message_count - 1 - len(history)
         messages_for_ai = [
-            {"role": m.role, "content": m.content}
-            for m in messages_db
+            {"role": role, "content": content}
+            for role, content, _ in _pack_history(history, budget, first_index)
         ]
-        messages_for_ai.append({"role": "user", "content": user_text})
+        messages_for_ai.append({"role": "user", "content": turn.user_text})
+        return messages_for_ai
 
-        try:
-            raw_reply = await generate_reply(messages_for_ai, tools=get_tools())
-        except Exception as e:
-            await logger.log(
-                level="ERROR",
-                module=__name__,
-                message=f"AI помилка: {e}\n{traceback.format_exc()}",
+    async def _get_history(self, conversation_id: int, message_count: int) -> list[HistoryItem]:
+        """
+        Історія з ring buffer; на промах або якщо буфер розійшовся з message_count у БД
+        (розмову дописала інша репліка) — з Postgres із заповненням буфера.
+        """
+        history = history_buffer.get(conversation_id, message_count)
+        if history is None:
+            messages_db = await self._get_last_messages(conversation_id, n=LAST_N_MESSAGES)
+            history = [_history_item(m) for m in messages_db]
+            history_buffer.fill(conversation_id, history, message_count)
+        return history
+
+    def _buffer_on_commit(
+        self, conversation_id: int, role: str, content: str, tokens: int
+    ) -> None:
+        on_commit(
+            self.session, lambda: history_buffer.append(conversation_id, role, content, tokens)
+        )
+
+    async def _claim_message_slot(
+        self, conversation_id: int
+    ) -> Optional[tuple[int, Optional[str]]]:
+        """
+        Атомарно +1 до message_count, якщо conversation ще активна і не заповнена.
+        Повертає (новий message_count, summary); None — треба повний шлях (rollover або
+        розмову закрили).
+        """
+        result = await self.session.execute(
+            update(Conversation)
+            .where(
+                Conversation.id == conversation_id,
+                Conversation.status == "active",
+                Conversation.message_count < MAX_MESSAGES_PER_CONVERSATION,
             )
-            raw_reply = AI_ERROR_FALLBACK
+            .values(message_count=Conversation.message_count + 1)
+            .returning(Conversation.message_count, Conversation.summary)
+            .execution_options(synchronize_session=False)
+        )
+        row = result.first()
+        return None if row is None else (row[0], row[1])
 
-        assistant_msg = Message(
-            conversation_id=conversation.id,
-            role="assistant",
-            content=raw_reply,
+    def _cache_identity_on_commit(
+        self, telegram_id: int, user: User, conversation: Conversation
+    ) -> None:
+        identity = CachedIdentity(
+            user_id=user.id, username=user.username, conversation_id=conversation.id
+        )
+        on_commit(self.session, lambda: identity_cache.put(telegram_id, identity))
+
+    async def _load_context(
+        self, telegram_id: int, n: int
+    ) -> tuple[Optional[User], Optional[Conversation], list[Message]]:
+        """
+        Один запит: user + його активна conversation + останні n повідомлень (LATERAL).
+        Повертає (user | None, conversation | None, messages у хронологічному порядку).
+        """
+        last_messages = (
+            select(Message)
+            .where(Message.conversation_id == Conversation.id)
+            .order_by(desc(Message.created_at), desc(Message.id))
+            .limit(n)
+            .lateral("last_messages")
+        )
+        last_message = aliased(Message, last_messages)
+        stmt = (
+            select(User, Conversation, last_message)
+            .select_from(User)
+            .outerjoin(
+                Conversation,
+                and_(
+                    Conversation.id == User.active_conversation_id,
+                    Conversation.status == "active",
+                ),
+            )
+            .outerjoin(last_messages, true())
+            .where(User.telegram_id == telegram_id)
+            # ORDER BY всередині LATERAL не задає порядок рядків зовнішнього запиту —
+            # хронологічний порядок для AI задаємо явно
+            .order_by(last_message.created_at, last_message.id)
         )
-        self.session.add(assistant_msg)
-        # commit робить UnitOfWork при виході з контексту
-        return raw_reply
+        rows = (await self.session.execute(stmt)).all()
+        if not rows:
+            return None, None, []
+        user, conversation = rows[0][0], rows[0][1]
+        messages = [row[2] for row in rows if row[2] is not None]
+        return user, conversation, messages
 
     async def _get_or_create_user(self, telegram_id: int, username: str | None) -> User:
-        result = await self.session.execute(select(User).where(User.telegram_id == telegram_id))
-        user = result.scalars().first()
-        if user is None:
-            user = User(telegram_id=telegram_id, username=username)
-            self.session.add(user)
-            await self.session.flush()
-        elif username is not None and user.username != username:
-            user.username = username
-        return user
+        """
+        INSERT ... ON CONFLICT (telegram_id) DO UPDATE — один запит, без гонки
+        «обидва не знайшли → обидва вставили». username не затирається на NULL.
+        """
+        stmt = pg_insert(User).values(telegram_id=telegram_id, username=username)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_={"username": func.coalesce(stmt.excluded.username, User.username)},
+        ).returning(User)
+        result = await self.session.execute(
+            stmt, execution_options={"populate_existing": True}
+        )
+        return result.scalar_one()
 
     async def _get_or_create_active_conversation(self, user: User) -> Conversation:
         """
@@ -119,30 +411,287 @@ class ChatService:
             )
             conv = result.scalars().first()
             if conv is None:
-                conv = Conversation(user_id=user.id, status="active")
-                self.session.add(conv)
-                await self.session.flush()
-                user.active_conversation_id = conv.id
-                return conv
+                return await self._create_conversation(user)
+            user.active_conversation_id = conv.id
 
-        count_result = await self.session.execute(
-            select(func.count(Message.id)).where(Message.conversation_id == conv.id)
-        )
-        count = count_result.scalar() or 0
-        if count >= MAX_MESSAGES_PER_CONVERSATION:
+        return await self._rollover_if_full(user, conv)
+
+    async def _rollover_if_full(self, user: User, conv: Conversation) -> Conversation:
+        """
+        Rollover за денормалізованим conversations.message_count — без COUNT(*) по messages.
+        Нова розмова стартує з summary закритої; після commit summarizer дописує в неї
+        зміст останніх повідомлень закритої розмови.
+        """
+        if conv.message_count >= MAX_MESSAGES_PER_CONVERSATION:
             conv.status = "closed"
-            new_conv = Conversation(user_id=user.id, status="active")
-            self.session.add(new_conv)
-            await self.session.flush()
-            user.active_conversation_id = new_conv.id
+            new_conv = await self._create_conversation(user, summary=conv.summary)
+            old_id, new_id = conv.id, new_conv.id
+            on_commit(self.session, lambda: summarizer.schedule(old_id, carry_to=new_id))
             return new_conv
         return conv
 
+    async def _create_conversation(self, user: User, summary: Optional[str] = None) -> Conversation:
+        conv = Conversation(user_id=user.id, status="active", message_count=0, summary=summary)
+        self.session.add(conv)
+        await self.session.flush()
+        user.active_conversation_id = conv.id
+        return conv
+
     async def _get_last_messages(self, conversation_id: int, n: int = LAST_N_MESSAGES) -> list[Message]:
+        """Останні n повідомлень у хронологічному порядку (вибірка з кінця, потім reverse)."""
         result = await self.session.execute(
             select(Message)
             .where(Message.conversation_id == conversation_id)
-            .order_by(Message.created_at)
+            .order_by(desc(Message.created_at), desc(Message.id))
             .limit(n)
         )
-        return list(result.scalars().all())
+        return list(reversed(result.scalars().all()))
+
+
+def _history_item(message: Message) -> HistoryItem:
+    # token_count NULL — рядок до міграції 004: рахуємо при читанні
+    tokens = message.token_count
+    if tokens is None:
+        tokens = count_tokens(message.content)
+    return message.role, message.content, tokens
+
+
+def _pack_history(
+    history: list[HistoryItem], budget: int, first_index: int = 0
+) -> list[HistoryItem]:
+    """
+    Від найновішого до старішого, поки сума токенів (із службовими) вміщається в budget
+    і повідомлень не більше CONTEXT_MAX_MESSAGES. Зупиняємось на першому, що не влазить —
+    історія лишається суцільною.
+
+    Якщо вікно починається не з початку розмови (відкинуто за бюджетом, ліміт повідомлень
+    або старші просто не прочитані), його початок вирівнюється вгору до кратного кроку
+    (CONTEXT_WINDOW_STEP) номера в розмові (first_index — номер history[0]): вікно зсувається
+    стрибками, а не на одне повідомлення щоходу, тож кілька ходів поспіль мають спільний
+    префікс історії і prompt cache OpenAI покриває не лише system prompt.
+    """
+    limit = max(len(history) - settings.CONTEXT_MAX_MESSAGES, 0)
+    used = 0
+    start = len(history)
+    for i in range(len(history) - 1, limit - 1, -1):
+        used += history[i][2] + MESSAGE_OVERHEAD_TOKENS
+        if used > budget:
+            break
+        start = i
+    # Крок не більше половини того, що вміщається: вирівнювання не зʼїдає більшу частину історії
+    step = min(settings.CONTEXT_WINDOW_STEP, (len(history) - start) // 2)
+    if first_index + start > 0 and step > 1:
+        aligned = -(-(first_index + start) // step) * step
+        start = min(aligned - first_index, len(history))
+    return history[start:]
+
+
+def _schedule_summary(turn: ChatTurn) -> None:
+    # Хід додав два повідомлення: message_count - 1 → message_count + 1
+    summarizer.maybe_schedule(turn.conversation_id, turn.message_count - 1, turn.message_count + 1)
+
+
+async def _generate_reply_safe(turn: ChatTurn) -> str:
+    try:
+        return await generate_reply(
+            turn.messages_for_ai,
+            tools=get_tools(turn.tool_names),
+            user_key=turn.user_key,
+            summary=turn.summary,
+            usage=turn.usage,
+            system_prompt=turn.system_prompt,
+        )
+    except LLMQueueTimeout as e:
+        await logger.log(level="WARNING", module=__name__, message=f"AI відхилено: {e}")
+        return AI_BUSY_FALLBACK
+    except Exception as e:
+        await logger.log(
+            level="ERROR",
+            module=__name__,
+            message=f"AI помилка: {e}\n{traceback.format_exc()}",
+        )
+        return AI_ERROR_FALLBACK
+
+
+async def _persist_user_message(turn: ChatTurn) -> None:
+    """Write-behind: поставити user msg у writer після commit транзакції 1."""
+    if not turn.user_message_pending:
+        return
+    try:
+        await message_writer.submit(
+            turn.conversation_id,
+            "user",
+            turn.user_text,
+            count_delta=0,
+            token_count=turn.user_tokens,
+            prompt_version=turn.prompt_version,
+        )
+    except Exception as e:
+        # ack-режим: пачка не записалась — відповідь все одно генеруємо, факт логуємо
+        await logger.log(
+            level="ERROR",
+            module=__name__,
+            message=f"Не вдалося зберегти user msg (conversation {turn.conversation_id}): {e}",
+        )
+    turn.user_message_pending = False
+
+
+async def _save_reply(turn: ChatTurn, raw_reply: str) -> None:
+    """
+    Транзакція 2 з повтором. Якщо всі спроби невдалі — відповідь користувач однаково
+    отримує, а в історії лишається user msg без assistant (лог ERROR з текстом відповіді).
+    Наступний хід просто побачить два user-повідомлення поспіль.
+
+    У write-behind режимі повтори робить сам writer.
+    """
+    attempts = 1 if message_writer is not None else SAVE_REPLY_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        try:
+            if message_writer is not None:
+                await message_writer.submit(
+                    turn.conversation_id,
+                    "assistant",
+                    raw_reply,
+                    token_count=count_tokens(raw_reply),
+                    usage=turn.usage,
+                    prompt_version=turn.prompt_version,
+                )
+            else:
+                async with UnitOfWork() as uow:
+                    await ChatService(uow.session).complete_turn(turn, raw_reply)
+            _schedule_summary(turn)
+            return
+        except Exception as e:
+            if attempt < attempts:
+                await asyncio.sleep(SAVE_REPLY_RETRY_DELAY_SEC)
+                continue
+            await logger.log(
+                level="ERROR",
+                module=__name__,
+                message=(
+                    f"Не вдалося зберегти відповідь (conversation {turn.conversation_id}): {e}\n"
+                    f"Відповідь: {raw_reply}"
+                ),
+            )
+
+
+# telegram_id → [lock, скільки ходів його тримають або чекають]; запис видаляється з останнім
+_local_turn_locks: dict[int, list] = {}
+
+
+@asynccontextmanager
+async def _local_turn_lock(telegram_id: int) -> AsyncIterator[None]:
+    """
+    Ходи одного користувача в процесі — по черзі, навіть з різних чатів: розмова в БД
+    одна на користувача. Між процесами достатньо шардування supervisor за user_id;
+    між репліками — CHAT_TURN_LOCK.
+    """
+    entry = _local_turn_locks.get(telegram_id)
+    if entry is None:
+        entry = _local_turn_locks[telegram_id] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _local_turn_locks[telegram_id]
+
+
+@asynccontextmanager
+async def _chat_turn_lock(telegram_id: int) -> AsyncIterator[None]:
+    """
+    Увесь хід чату (разом з LLM) — під lock користувача в процесі (завжди) і, з
+    CHAT_TURN_LOCK, під advisory lock, щоб дві репліки не відповідали одночасно.
+    Advisory lock тримає одне зʼєднання з БД на хід; не дочекались за
+    CHAT_TURN_LOCK_TIMEOUT_SEC — відповідаємо без нього (WARNING).
+    """
+    async with _local_turn_lock(telegram_id):
+        if not settings.CHAT_TURN_LOCK or settings.DB_PGBOUNCER_MODE:
+            yield
+            return
+        async with advisory_session_lock(
+            LOCK_NS_CHAT_TURN, telegram_id, timeout=settings.CHAT_TURN_LOCK_TIMEOUT_SEC
+        ) as acquired:
+            if not acquired:
+                await logger.log(
+                    level="WARNING",
+                    module=__name__,
+                    message=f"Chat turn lock для {telegram_id} не отримано, хід без lock",
+                )
+            yield
+
+
+async def run_chat_turn(
+    telegram_id: int,
+    username: str | None,
+    user_text: str,
+    tool_names: Optional[Iterable[str]] = None,
+) -> str:
+    """
+    Хід діалогу: транзакція 1 → LLM (без зʼєднання з БД) → транзакція 2.
+    Помилка транзакції 1 прокидається (нічого не збережено, AI не викликався).
+    """
+    async with _chat_turn_lock(telegram_id):
+        async with UnitOfWork() as uow:
+            turn = await ChatService(uow.session, tool_names).start_turn(
+                telegram_id, username, user_text
+            )
+        await _persist_user_message(turn)
+        raw_reply = await _generate_reply_safe(turn)
+        await _save_reply(turn, raw_reply)
+    return raw_reply
+
+
+async def stream_chat_turn(
+    telegram_id: int,
+    username: str | None,
+    user_text: str,
+    tool_names: Optional[Iterable[str]] = None,
+) -> AsyncIterator[str]:
+    """
+    Як run_chat_turn, але віддає відповідь шматками. Повний текст зберігається після stream.
+
+    Якщо AI падає до першого шматка — віддаємо AI_ERROR_FALLBACK; якщо посередині —
+    зберігаємо те, що встигли отримати. Те саме, якщо викликач закрив генератор
+    (aclose) посеред stream: збереження і звільнення lock — у finally.
+    """
+    async with _chat_turn_lock(telegram_id):
+        async with UnitOfWork() as uow:
+            turn = await ChatService(uow.session, tool_names).start_turn(
+                telegram_id, username, user_text
+            )
+        await _persist_user_message(turn)
+
+        parts: list[str] = []
+        stream = generate_reply_stream(
+            turn.messages_for_ai,
+            tools=get_tools(turn.tool_names),
+            user_key=turn.user_key,
+            summary=turn.summary,
+            usage=turn.usage,
+            system_prompt=turn.system_prompt,
+        )
+        try:
+            async for delta in stream:
+                parts.append(delta)
+                yield delta
+        except LLMQueueTimeout as e:
+            await logger.log(level="WARNING", module=__name__, message=f"AI відхилено: {e}")
+            if not parts:
+                parts.append(AI_BUSY_FALLBACK)
+                yield AI_BUSY_FALLBACK
+        except Exception as e:
+            await logger.log(
+                level="ERROR",
+                module=__name__,
+                message=f"AI помилка (stream): {e}\n{traceback.format_exc()}",
+            )
+            if not parts:
+                parts.append(AI_ERROR_FALLBACK)
+                yield AI_ERROR_FALLBACK
+        finally:
+            # Слот llm_scheduler і HTTP-stream звільняються одразу, а не при збиранні сміття
+            await stream.aclose()
+            await _save_reply(turn, "".join(parts).strip())
@@ -0,0 +1,133 @@
+"""
+Write-through ring buffer останніх N повідомлень (role, content, tokens) для активних розмов.
+
+Бот сам записав усі ці повідомлення секунди тому — перечитувати їх з Postgres
+на кожне повідомлення не потрібно. На промах буфер заповнюється з БД; після commit
+кожного user/assistant msg — дописується (db.on_commit). Загальний ліміт символів на
+всі розмови; при перевищенні і для розмов без активності довше idle_ttl — витіснення.
+
+Разом з повідомленнями буфер рахує, скільки їх у розмові всього (message_count, якому
+відповідає його вміст). Викликач порівнює це з conversations.message_count з БД: якщо
+інша репліка чи процес дописали розмову, лічильники розходяться — буфер застарів і
+перечитується з Postgres.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict, deque
+from typing import Iterable, Optional
+
+HistoryItem = tuple[str, str, int]  # (role, content, token_count)
+
+
+class _Entry:
+    __slots__ = ("items", "chars", "last_access", "total")
+
+    def __init__(self, maxlen: int, total: int):
+        self.items: deque[HistoryItem] = deque(maxlen=maxlen)
+        self.chars = 0
+        self.last_access = time.monotonic()
+        # Скільки повідомлень у розмові разом з цими (а не лише в буфері)
+        self.total = total
+
+
+class HistoryBuffer:
+    """conversation_id → deque останніх max_messages повідомлень, LRU між розмовами."""
+
+    def __init__(self, max_messages: int, max_total_chars: int, idle_ttl: float):
+        self.max_messages = max_messages
+        self.max_total_chars = max_total_chars
+        self.idle_ttl = idle_ttl
+        self._data: OrderedDict[int, _Entry] = OrderedDict()
+        self._total_chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get(
+        self, conversation_id: int, message_count: Optional[int] = None
+    ) -> Optional[list[HistoryItem]]:
+        """
+        Останні повідомлення в хронологічному порядку або None (промах — читати з БД).
+        message_count — скільки повідомлень у розмові за БД; інше число в буфері — промах.
+        """
+        self._evict_idle()
+        entry = self._data.get(conversation_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        if message_count is not None and entry.total != message_count:
+            self.stale += 1
+            self.misses += 1
+            self.drop(conversation_id)
+            return None
+        self.hits += 1
+        entry.last_access = time.monotonic()
+        self._data.move_to_end(conversation_id)
+        return list(entry.items)
+
+    def fill(
+        self, conversation_id: int, items: Iterable[HistoryItem], message_count: int
+    ) -> None:
+        """
+        Заповнити з БД (після промаху або при створенні нової розмови). message_count —
+        скільки повідомлень у розмові всього (items — лише останні з них).
+        """
+        self.drop(conversation_id)
+        entry = _Entry(self.max_messages, message_count)
+        self._data[conversation_id] = entry
+        for item in items:
+            self._push(entry, item)
+        self._evict_over_limit()
+
+    def append(self, conversation_id: int, role: str, content: str, tokens: int) -> None:
+        """Дописати закомічене повідомлення. Якщо розмови в буфері немає — нічого не робимо."""
+        entry = self._data.get(conversation_id)
+        if entry is None:
+            return
+        self._push(entry, (role, content, tokens))
+        entry.total += 1
+        entry.last_access = time.monotonic()
+        self._data.move_to_end(conversation_id)
+        self._evict_over_limit()
+
+    def drop(self, conversation_id: int) -> None:
+        entry = self._data.pop(conversation_id, None)
+        if entry is not None:
+            self._total_chars -= entry.chars
+
+    def _push(self, entry: _Entry, item: HistoryItem) -> None:
+        if len(entry.items) == entry.items.maxlen:
+            old = entry.items[0]
+            entry.chars -= len(old[1])
+            self._total_chars -= len(old[1])
+        entry.items.append(item)
+        entry.chars += len(item[1])
+        self._total_chars += len(item[1])
+
+    def _evict_over_limit(self) -> None:
+        # Найдавніше використані розмови — першими; поточну (кінець OrderedDict) лишаємо
+        while self._total_chars > self.max_total_chars and len(self._data) > 1:
+            _, entry = self._data.popitem(last=False)
+            self._total_chars -= entry.chars
+
+    def _evict_idle(self) -> None:
+        deadline = time.monotonic() - self.idle_ttl
+        while self._data:
+            conversation_id, entry = next(iter(self._data.items()))
+            if entry.last_access >= deadline:
+                break
+            self.drop(conversation_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "conversations": len(self._data),
+            "chars": self._total_chars,
+            "hits": self.hits,
+            "misses": self.misses,
+            # З них — буфер розійшовся з message_count у БД (розмову дописав інший процес)
+            "stale": self.stale,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,45 @@
+"""
+In-process кеш telegram_id → (user_id, username, active_conversation_id).
+
+Ці звʼязки змінюються рідко (зміна username, rollover розмови), а резолвились на кожне
+повідомлення під advisory lock. З кешем хід не бере lock і не читає users; запитів
+менше лише разом з влученням у history_buffer (інакше історію однаково читаємо з БД). Кеш оновлюється лише після commit (db.on_commit), тож rollback не лишає
+в ньому неіснуючих id. Якщо кешована conversation вже не активна — ChatService
+помічає це атомарним UPDATE ... RETURNING і скидає запис.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+from config import settings
+from tools.ttl_cache import TTLCache
+
+
+@dataclass(frozen=True)
+class CachedIdentity:
+    user_id: int
+    username: Optional[str]
+    conversation_id: int
+
+
+_cache: TTLCache[CachedIdentity] = TTLCache(
+    maxsize=settings.IDENTITY_CACHE_MAX_ENTRIES, ttl=settings.IDENTITY_CACHE_TTL_SEC
+)
+
+
+def get(telegram_id: int) -> Optional[CachedIdentity]:
+    return _cache.get(telegram_id)
+
+
+def put(telegram_id: int, identity: CachedIdentity) -> None:
+    _cache.set(telegram_id, identity)
+
+
+def invalidate(telegram_id: int) -> None:
+    _cache.pop(telegram_id)
+
+
+def stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,213 @@
+"""
+Планувальник викликів LLM: ліміт паралельних запитів, RPM/TPM token buckets, черга
+з чесним round-robin між користувачами.
+
+Замість того, щоб під навантаженням усі запити одночасно отримали 429 від OpenAI,
+вони чекають у черзі, доки є вільний слот і бюджет у buckets. Черга — окрема на
+кожного user_key; слоти роздаються по колу, тож користувач із десятком запитів
+не блокує інших. Якщо запит чекав довше за max_queue_wait — LLMQueueTimeout.
+
+TPM рахується за оцінкою токенів prompt (estimate_tokens); після відповіді різниця
+з фактичним usage довраховується (Ticket.report_usage).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Hashable, Optional
+
+from config import settings
+from db.pool_stats import WaitHistogram
+
+# Грубе співвідношення символів до токенів для оцінки prompt
+_CHARS_PER_TOKEN = 4
+
+
+class LLMQueueTimeout(Exception):
+    """Запит не отримав слот за max_queue_wait — відхилено, до OpenAI не пішов."""
+
+
+def estimate_tokens(
+    messages: list[dict[str, Any]], tools: Optional[list[dict[str, Any]]] = None
+) -> int:
+    """Оцінка токенів prompt за довжиною JSON (без токенізатора)."""
+    chars = sum(len(str(m.get("content") or "")) for m in messages)
+    if tools:
+        chars += len(json.dumps(tools, ensure_ascii=False))
+    # ~4 службових токени на кожне повідомлення
+    return chars // _CHARS_PER_TOKEN + 4 * len(messages)
+
+
+class TokenBucket:
+    """Bucket з неперервним поповненням: capacity на хвилину, refill = capacity / 60 за секунду."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Скільки секунд чекати, поки в bucket буде amount (більше за capacity — як capacity)."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def consume(self, amount: float) -> None:
+        """Списати amount; може піти в мінус (борг після фактичного usage)."""
+        self._refill()
+        self.tokens -= amount
+
+
+@dataclass
+class _Waiter:
+    tokens: int
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class Ticket:
+    """Виданий слот. report_usage — фактичні токени з відповіді OpenAI."""
+
+    def __init__(self, scheduler: "LLMScheduler", estimated_tokens: int):
+        self._scheduler = scheduler
+        self.estimated_tokens = estimated_tokens
+
+    def report_usage(self, total_tokens: Optional[int]) -> None:
+        if total_tokens is None or self._scheduler._tpm is None:
+            return
+        # Довраховуємо (або повертаємо) різницю між оцінкою і фактом
+        self._scheduler._tpm.consume(total_tokens - self.estimated_tokens)
+        self.estimated_tokens = total_tokens
+
+
+class LLMScheduler:
+    """Черга запитів до LLM. 0 у rpm/tpm — без відповідного ліміту."""
+
+    def __init__(self, max_concurrency: int, rpm: int, tpm: int, max_queue_wait: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue_wait = max_queue_wait
+        self._rpm = TokenBucket(rpm) if rpm > 0 else None
+        self._tpm = TokenBucket(tpm) if tpm > 0 else None
+        # user_key → черга очікувань; порядок ключів = черговість round-robin
+        self._queues: OrderedDict[Hashable, deque[_Waiter]] = OrderedDict()
+        self._active = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.wait_histogram = WaitHistogram()
+        self.granted = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self, user_key: Hashable, tokens: int) -> AsyncIterator[Ticket]:
+        """Дочекатися слоту (або LLMQueueTimeout), виконати блок, звільнити слот."""
+        await self._acquire(user_key, tokens)
+        try:
+            yield Ticket(self, tokens)
+        finally:
+            self._active -= 1
+            self._pump()
+
+    async def _acquire(self, user_key: Hashable, tokens: int) -> None:
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(tokens=tokens, future=loop.create_future())
+        self._queues.setdefault(user_key, deque()).append(waiter)
+        self._pump()
+        if waiter.future.done():
+            return
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.max_queue_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Слот видано в ту ж мить: при скасуванні повертаємо його, при таймауті — беремо
+                if isinstance(e, asyncio.CancelledError):
+                    self._active -= 1
+                    self._pump()
+                    raise
+                return
+            # _pump пропускає скасовані очікування
+            waiter.future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                self.wait_histogram.timeouts += 1
+                raise LLMQueueTimeout(
+                    f"LLM queue wait exceeded {self.max_queue_wait:g}s"
+                ) from None
+            raise
+
+    def _pump(self) -> None:
+        """Роздати вільні слоти по колу між користувачами, поки дозволяють buckets."""
+        while self._active < self.max_concurrency and self._queues:
+            user_key, queue = next(iter(self._queues.items()))
+            while queue and queue[0].future.cancelled():
+                queue.popleft()
+            if not queue:
+                del self._queues[user_key]
+                continue
+
+            waiter = queue[0]
+            delay = max(
+                self._rpm.wait_time(1) if self._rpm is not None else 0.0,
+                self._tpm.wait_time(waiter.tokens) if self._tpm is not None else 0.0,
+            )
+            if delay > 0:
+                self._schedule(delay)
+                return
+
+            queue.popleft()
+            if self._rpm is not None:
+                self._rpm.consume(1)
+            if self._tpm is not None:
+                self._tpm.consume(waiter.tokens)
+            self._active += 1
+            self.granted += 1
+            self.wait_histogram.observe((time.monotonic() - waiter.enqueued_at) * 1000)
+            waiter.future.set_result(None)
+
+            # Наступний слот — іншому користувачу
+            if queue:
+                self._queues.move_to_end(user_key)
+            else:
+                del self._queues[user_key]
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is not None and not self._timer.cancelled():
+            return
+
+        def _fire() -> None:
+            self._timer = None
+            self._pump()
+
+        self._timer = asyncio.get_running_loop().call_later(delay, _fire)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "active": self._active,
+            "queued": sum(
+                1 for q in self._queues.values() for w in q if not w.future.cancelled()
+            ),
+            "queued_users": len(self._queues),
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "rpm_available": round(self._rpm.tokens, 1) if self._rpm is not None else None,
+            "tpm_available": round(self._tpm.tokens, 1) if self._tpm is not None else None,
+            "queue_wait": self.wait_histogram.snapshot(),
+        }
+
+
+llm_scheduler = LLMScheduler(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    rpm=settings.LLM_RPM_LIMIT,
+    tpm=settings.LLM_TPM_LIMIT,
+    max_queue_wait=settings.LLM_MAX_QUEUE_WAIT_SEC,
+)
@@ -0,0 +1,80 @@
+"""
+Облік токенів викликів LLM: prompt, з них кешовані (prompt caching OpenAI), completion.
+
+OpenAI кешує найдовший спільний префікс prompt (від ~1024 токенів) і рахує ці токени
+дешевше і швидше — якщо префікс побайтово той самий між запитами. LLMUsage збирає
+usage одного ходу (усі виклики, включно з раундом tools) для запису в Message;
+usage_stats — сумарні лічильники процесу по призначенню виклику (reply, summary).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+@dataclass
+class LLMUsage:
+    """Сума usage кількох викликів. calls == 0 — LLM не викликався (mock, кеш відповідей)."""
+
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+    calls: int = 0
+
+    def add(self, other: "LLMUsage") -> None:
+        self.prompt_tokens += other.prompt_tokens
+        self.cached_tokens += other.cached_tokens
+        self.completion_tokens += other.completion_tokens
+        self.calls += other.calls
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+def usage_from_response(usage: Any) -> Optional[LLMUsage]:
+    """response.usage (або usage останнього chunk stream) → LLMUsage; None — usage немає."""
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return LLMUsage(
+        prompt_tokens=getattr(usage, "prompt_tokens", None) or 0,
+        cached_tokens=getattr(details, "cached_tokens", None) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", None) or 0,
+        calls=1,
+    )
+
+
+class UsageStats:
+    """Лічильники по призначенню виклику; cached_ratio — частка prompt-токенів з кешу."""
+
+    def __init__(self) -> None:
+        self._by_purpose: dict[str, LLMUsage] = {}
+        # Виклики, де кеш не спрацював зовсім (cached_tokens == 0)
+        self._cache_misses: dict[str, int] = {}
+
+    def record(self, purpose: str, usage: LLMUsage) -> None:
+        self._by_purpose.setdefault(purpose, LLMUsage()).add(usage)
+        if not usage.cached_tokens:
+            self._cache_misses[purpose] = self._cache_misses.get(purpose, 0) + usage.calls
+
+    def stats(self) -> dict[str, Any]:
+        result: dict[str, Any] = {}
+        for purpose, usage in self._by_purpose.items():
+            result[purpose] = {
+                "calls": usage.calls,
+                "prompt_tokens": usage.prompt_tokens,
+                "cached_tokens": usage.cached_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "cache_miss_calls": self._cache_misses.get(purpose, 0),
+                "cached_ratio": (
+                    round(usage.cached_tokens / usage.prompt_tokens, 4)
+                    if usage.prompt_tokens
+                    else 0.0
+                ),
+            }
+        return result
+
+
+usage_stats = UsageStats()
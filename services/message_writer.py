@@ -0,0 +1,238 @@
+"""
+Write-behind запис повідомлень: черга → пачка → один multi-row INSERT.
+
+Замість сотень дрібних транзакцій на секунду — одна транзакція на пачку раз на
+flush_interval або при batch_size рядках. message_count розмов оновлюється в тій самій
+транзакції одним UPDATE з CASE.
+
+Durability:
+- "ack" — submit() чекає, поки пачка закомічена (помилка прокидається викликачу);
+- "fire_and_forget" — submit() повертається одразу, помилки лише логуються.
+При зупинці close() синхронно скидає все, що лишилось у черзі.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from sqlalchemy import case, insert, update
+
+from db import UnitOfWork
+from db.models import Conversation, Message
+from logger import logger
+from services.llm_usage import LLMUsage
+
+# Скільки разів пробувати записати пачку
+_FLUSH_ATTEMPTS = 2
+
+
+@dataclass
+class PendingMessage:
+    conversation_id: int
+    role: str
+    content: str
+    # На скільки збільшити conversations.message_count (0 — вже враховано в транзакції 1)
+    count_delta: int = 1
+    token_count: Optional[int] = None
+    usage: Optional[LLMUsage] = None
+    prompt_version: Optional[str] = None
+    future: Optional[asyncio.Future] = field(default=None, repr=False)
+
+
+def usage_columns(usage: Optional[LLMUsage]) -> dict[str, Optional[int]]:
+    """Колонки usage для Message; NULL, якщо LLM не викликався."""
+    if usage is None or not usage.calls:
+        return {"prompt_tokens": None, "cached_tokens": None, "completion_tokens": None}
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "cached_tokens": usage.cached_tokens,
+        "completion_tokens": usage.completion_tokens,
+    }
+
+
+class MessageWriteBehind:
+    """Фоновий batch-writer повідомлень."""
+
+    def __init__(
+        self,
+        flush_interval: float,
+        batch_size: int,
+        wait_for_flush: bool,
+        on_flushed: Optional[Callable[[list[PendingMessage]], None]] = None,
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.wait_for_flush = wait_for_flush
+        self.on_flushed = on_flushed
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.flushed_rows = 0
+        self.flushed_batches = 0
+        self.failed_rows = 0
+
+    async def submit(
+        self,
+        conversation_id: int,
+        role: str,
+        content: str,
+        count_delta: int = 1,
+        token_count: Optional[int] = None,
+        usage: Optional[LLMUsage] = None,
+        prompt_version: Optional[str] = None,
+    ) -> None:
+        """Поставити повідомлення в чергу. У режимі ack — дочекатися commit пачки."""
+        if self._closed:
+            raise RuntimeError("MessageWriteBehind is closed")
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+        item = PendingMessage(
+            conversation_id, role, content, count_delta, token_count, usage, prompt_version
+        )
+        if self.wait_for_flush:
+            item.future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(item)
+        if item.future is not None:
+            await item.future
+
+    async def _run(self) -> None:
+        while True:
+            first = await self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                # Чекачі пачки вже отримали помилку (_flush) — writer працює далі
+                await logger.log(
+                    level="ERROR",
+                    module=__name__,
+                    message=f"Write-behind: збій пачки: {e}\n{traceback.format_exc()}",
+                )
+            if stop:
+                return
+
+    async def _flush(self, batch: list[PendingMessage]) -> None:
+        error: Optional[BaseException] = None
+        try:
+            for _ in range(_FLUSH_ATTEMPTS):
+                try:
+                    await self._write(batch)
+                    error = None
+                    break
+                except Exception as e:
+                    error = e
+
+            if error is None:
+                self.flushed_rows += len(batch)
+                self.flushed_batches += 1
+                await self._notify_flushed(batch)
+            else:
+                self.failed_rows += len(batch)
+                await logger.log(
+                    level="ERROR",
+                    module=__name__,
+                    message=f"Write-behind: не вдалося записати {len(batch)} повідомлень: {error}",
+                )
+        except BaseException as e:
+            # Скасування writer або збій логера — чекачі пачки не висять вічно
+            error = e
+            raise
+        finally:
+            for item in batch:
+                if item.future is None or item.future.done():
+                    continue
+                if error is None:
+                    item.future.set_result(None)
+                elif isinstance(error, Exception):
+                    item.future.set_exception(error)
+                else:
+                    item.future.cancel()
+
+    async def _notify_flushed(self, batch: list[PendingMessage]) -> None:
+        """on_flushed (дописати буфер історії) — помилка в ньому не зупиняє writer."""
+        if self.on_flushed is None:
+            return
+        try:
+            self.on_flushed(batch)
+        except Exception as e:
+            # Пачка вже закомічена — ходи, що її чекають, успішні; буфер перечитається з БД
+            # за розбіжністю message_count
+            await logger.log(
+                level="ERROR",
+                module=__name__,
+                message=f"Write-behind: on_flushed впав: {e}\n{traceback.format_exc()}",
+            )
+
+    async def _write(self, batch: list[PendingMessage]) -> None:
+        deltas: dict[int, int] = {}
+        for item in batch:
+            if item.count_delta:
+                deltas[item.conversation_id] = deltas.get(item.conversation_id, 0) + item.count_delta
+
+        async with UnitOfWork() as uow:
+            # Один multi-row INSERT; порядок рядків = порядок id = порядок у розмові
+            await uow.session.execute(
+                insert(Message).values(
+                    [
+                        {
+                            "conversation_id": item.conversation_id,
+                            "role": item.role,
+                            "content": item.content,
+                            "token_count": item.token_count,
+                            "prompt_version": item.prompt_version,
+                            **usage_columns(item.usage),
+                        }
+                        for item in batch
+                    ]
+                )
+            )
+            if deltas:
+                await uow.session.execute(
+                    update(Conversation)
+                    .where(Conversation.id.in_(deltas))
+                    .values(
+                        message_count=Conversation.message_count
+                        + case(deltas, value=Conversation.id, else_=0)
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+
+    async def close(self) -> None:
+        """Скинути залишок черги в БД і зупинити writer (при зупинці бота)."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is not None and not self._task.done():
+            self._queue.put_nowait(None)
+            await self._task
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "flushed_rows": self.flushed_rows,
+            "flushed_batches": self.flushed_batches,
+            "failed_rows": self.failed_rows,
+        }
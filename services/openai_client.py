@@ -1,5 +1,9 @@
 """
-Клієнт OpenAI: імпорт AsyncOpenAI та створення клієнта.
+Клієнт OpenAI: імпорт AsyncOpenAI та один клієнт на процес.
+
+Чому singleton: AsyncOpenAI тримає пул HTTP-зʼєднань (keep-alive, TLS). Новий клієнт
+на кожне повідомлення = новий пул і TLS handshake. Клієнт створюється і прогрівається
+в main.main() (init_client + warmup), закривається при зупинці (close_client).
 
 Якщо бібліотека openai не встановлена — get_client повертає None, get_import_error() — текст помилки.
 """
@@ -8,15 +12,21 @@ from __future__ import annotations
 
 from typing import Any, Optional
 
+from config import settings
+
 try:
+    import openai  # type: ignore[import-untyped]
     from openai import AsyncOpenAI  # type: ignore[import-untyped]
     _openai_available = True
     _import_error: Optional[str] = None
 except Exception as e:  # pragma: no cover
+    openai = None  # type: ignore[assignment]
     AsyncOpenAI = None  # type: ignore[misc, assignment]
     _openai_available = False
     _import_error = str(e)
 
+_client: Any = None
+
 
 def is_available() -> bool:
     """Чи вдалося імпортувати OpenAI SDK."""
@@ -28,10 +38,72 @@ def get_import_error() -> Optional[str]:
     return _import_error
 
 
-def get_client(api_key: str) -> Any:
+def _build_client(api_key: str) -> Any:
+    """
+    AsyncOpenAI зі своїм пулом: ліміти зʼєднань і keep-alive з config. HTTP-клієнт і типи
+    (Limits, Timeout) — ті, що експортує сам SDK: окремий імпорт httpx не потрібен, а SDK,
+    що перейшов на інший HTTP-стек, лишається робочим.
     """
-    Повертає AsyncOpenAI(api_key=api_key) або None, якщо SDK не встановлено.
+    timeout = openai.Timeout(
+        settings.OPENAI_TIMEOUT_SEC, connect=settings.OPENAI_CONNECT_TIMEOUT_SEC
+    )
+    limits_type = type(getattr(openai, "DEFAULT_CONNECTION_LIMITS", None))
+    http_client = None
+    if hasattr(openai, "DefaultAsyncHttpxClient") and limits_type is not type(None):
+        http_client = openai.DefaultAsyncHttpxClient(
+            limits=limits_type(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY_SEC,
+            ),
+            timeout=timeout,
+        )
+    return AsyncOpenAI(
+        api_key=api_key,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        timeout=timeout,
+        http_client=http_client,
+    )
+
+
+def init_client(api_key: Optional[str] = None) -> Any:
+    """
+    Створює процесний клієнт (якщо ще немає) і повертає його.
+    None — якщо SDK не встановлено або немає ключа.
     """
-    if not _openai_available:
+    global _client
+    api_key = api_key or settings.OPENAI_API_KEY
+    if not _openai_available or not api_key:
         return None
-    return AsyncOpenAI(api_key=api_key)
+    if _client is None:
+        _client = _build_client(api_key)
+    return _client
+
+
+def get_client(api_key: str) -> Any:
+    """
+    Повертає спільний AsyncOpenAI або None, якщо SDK не встановлено.
+    Якщо init_client ще не викликали — клієнт створюється ліниво.
+    """
+    if _client is not None:
+        return _client
+    return init_client(api_key)
+
+
+async def warmup() -> None:
+    """
+    Прогрів пулу: один легкий запит (models.retrieve), щоб DNS, TCP і TLS
+    відбулись до першого повідомлення користувача. Помилки прокидаються — main їх логує.
+    """
+    client = init_client()
+    if client is None:
+        return
+    await client.models.retrieve(settings.OPENAI_MODEL)
+
+
+async def close_client() -> None:
+    """Закриває клієнт і його HTTP-пул (при зупинці бота)."""
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.close()
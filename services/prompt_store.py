@@ -0,0 +1,168 @@
+"""
+Сховище промптів з prompts/*.txt з гарячим перезавантаженням.
+
+Усі файли читаються один раз; далі фонове завдання раз на poll_interval робить лише
+stat() (mtime, розмір) і перечитує змінені файли. Новий набір збирається окремо і
+підміняється одним присвоєнням — запит бачить або старий, або новий набір цілком.
+На запит — жодного звернення до диска.
+
+Версія промпту — імʼя + хеш тексту: однакова на всіх репліках для того самого вмісту,
+записується в Message.prompt_version.
+
+Вибір system prompt: PROMPT_BY_CHAT (telegram_id → імʼя файлу без .txt), інакше
+PROMPT_SEGMENTS (імʼя → вага: стабільний розподіл користувачів за crc32), інакше
+system_prompt. Невідоме імʼя — system_prompt.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Hashable, Mapping, Optional
+
+from config import settings
+from logger import logger
+
+DEFAULT_SYSTEM_PROMPT = "system_prompt"
+
+# Stat-ключ файлу: зміна mtime або розміру — перечитати
+_FileStamp = tuple[int, int]
+
+
+@dataclass(frozen=True)
+class Prompt:
+    name: str
+    text: str
+    version: str
+
+
+def _read_prompt(path: Path) -> Prompt:
+    text = path.read_text(encoding="utf-8").strip()
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+    return Prompt(name=path.stem, text=text, version=f"{path.stem}:{digest}")
+
+
+class PromptStore:
+    """Імʼя промпту → Prompt; атомарна підміна набору при зміні файлів."""
+
+    def __init__(
+        self,
+        directory: Path,
+        poll_interval: float,
+        by_chat: Mapping[int, str],
+        segments: Mapping[str, int],
+    ):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.by_chat = dict(by_chat)
+        self.segments = [(name, weight) for name, weight in sorted(segments.items()) if weight > 0]
+        self._total_weight = sum(weight for _, weight in self.segments)
+        self._prompts: Optional[dict[str, Prompt]] = None
+        self._stamps: dict[Path, _FileStamp] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.reloads = 0
+
+    def _scan(self) -> dict[Path, _FileStamp]:
+        stamps: dict[Path, _FileStamp] = {}
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return stamps
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(".txt"):
+                stat = entry.stat()
+                stamps[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def _reload(self) -> bool:
+        """Перечитати змінені файли (у потоці). True — набір підмінено."""
+        stamps = self._scan()
+        if self._prompts is not None and stamps == self._stamps:
+            return False
+        previous = self._prompts or {}
+        prompts: dict[str, Prompt] = {}
+        loaded: dict[Path, _FileStamp] = {}
+        for path, stamp in stamps.items():
+            old = previous.get(path.stem)
+            if old is not None and self._stamps.get(path) == stamp:
+                prompts[path.stem] = old
+                loaded[path] = stamp
+                continue
+            try:
+                prompts[path.stem] = _read_prompt(path)
+                loaded[path] = stamp
+            except (OSError, UnicodeDecodeError):
+                # Файл саме переписується — лишаємо стару версію, перечитаємо наступним проходом
+                if old is not None:
+                    prompts[path.stem] = old
+        self._stamps = loaded
+        self._prompts = prompts
+        return True
+
+    def load(self) -> None:
+        """Перше завантаження (синхронно). Викликається з main.setup через to_thread."""
+        if self._prompts is None:
+            self._reload()
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self.load)
+        if self.poll_interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                changed = await asyncio.to_thread(self._reload)
+            except Exception as e:
+                await logger.log(level="WARNING", module=__name__, message=f"Prompt reload: {e}")
+                continue
+            if changed:
+                self.reloads += 1
+                versions = ", ".join(sorted(p.version for p in (self._prompts or {}).values()))
+                await logger.log(
+                    level="INFO", module=__name__, message=f"Промпти оновлено: {versions}"
+                )
+
+    def get(self, name: str) -> Optional[Prompt]:
+        if self._prompts is None:
+            # Без start() (скрипти, тести) — одноразове синхронне читання
+            self.load()
+        return self._prompts.get(name)
+
+    def select(self, chat_key: Hashable) -> Optional[Prompt]:
+        """System prompt для чату: PROMPT_BY_CHAT → сегмент → system_prompt."""
+        name = self.by_chat.get(chat_key) if isinstance(chat_key, int) else None
+        if name is None and self._total_weight and chat_key is not None:
+            bucket = zlib.crc32(str(chat_key).encode("utf-8")) % self._total_weight
+            for segment, weight in self.segments:
+                if bucket < weight:
+                    name = segment
+                    break
+                bucket -= weight
+        prompt = self.get(name) if name is not None else None
+        return prompt or self.get(DEFAULT_SYSTEM_PROMPT)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "versions": sorted(p.version for p in (self._prompts or {}).values()),
+            "reloads": self.reloads,
+        }
+
+
+prompt_store = PromptStore(
+    directory=Path(__file__).resolve().parents[1] / "prompts",
+    poll_interval=settings.PROMPTS_RELOAD_INTERVAL_SEC,
+    by_chat=settings.PROMPT_BY_CHAT,
+    segments=settings.PROMPT_SEGMENTS,
+)
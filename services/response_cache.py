@@ -0,0 +1,137 @@
+"""
+Кеш відповідей LLM за точним збігом prompt.
+
+Ключ — sha256 від (model, messages, tools): однаковий system prompt + історія + текст
+користувача → та сама відповідь без виклику моделі. Два рівні: in-memory LRU+TTL
+(процес) і опційно Postgres (спільний для реплік, переживає рестарт).
+
+Відповіді, під час яких викликались tools, не кешуються — їх результат залежить від
+зовнішнього стану. Помилки Postgres-рівня лише логуються: кеш ніколи не ламає відповідь.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from config import settings
+from db import LLMResponseCache, UnitOfWork
+from logger import logger
+from tools.ttl_cache import TTLCache
+
+# Раз на скільки записів у Postgres видаляти прострочені рядки
+_PRUNE_EVERY = 100
+
+
+def make_key(
+    model: str, messages: list[dict[str, Any]], tools: Optional[list[dict[str, Any]]]
+) -> str:
+    """Стабільний хеш prompt: sort_keys, щоб порядок ключів у dict не впливав на ключ."""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "tools": tools or []},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Дворівневий кеш відповідей: memory → Postgres. Рахує hits по рівнях, misses, stores."""
+
+    def __init__(self, ttl: float, max_entries: int, max_chars: int, use_db: bool):
+        self.ttl = ttl
+        self.max_chars = max_chars
+        self.use_db = use_db
+        self._memory: TTLCache[str] = TTLCache(maxsize=max_entries, ttl=ttl)
+        self.db_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.bypassed = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._memory.get(key)
+        if value is not None:
+            return value
+        if self.use_db:
+            value = await self._db_get(key)
+            if value is not None:
+                self.db_hits += 1
+                self._memory.set(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        if not value or len(value) > self.max_chars:
+            return
+        self._memory.set(key, value)
+        self.stores += 1
+        if self.use_db:
+            await self._db_set(key, value)
+
+    def bypass(self) -> None:
+        """Відповідь не кешується (були tool calls) — лише рахуємо для статистики."""
+        self.bypassed += 1
+
+    async def _db_get(self, key: str) -> Optional[str]:
+        try:
+            async with UnitOfWork() as uow:
+                result = await uow.session.execute(
+                    select(LLMResponseCache.response).where(
+                        LLMResponseCache.key == key,
+                        LLMResponseCache.expires_at > datetime.now(timezone.utc),
+                    )
+                )
+                return result.scalar()
+        except Exception as e:
+            await logger.log(level="WARNING", module=__name__, message=f"Response cache read: {e}")
+            return None
+
+    async def _db_set(self, key: str, value: str) -> None:
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        stmt = insert(LLMResponseCache).values(key=key, response=value, expires_at=expires_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[LLMResponseCache.key],
+            set_={"response": value, "expires_at": expires_at},
+        )
+        try:
+            async with UnitOfWork() as uow:
+                await uow.session.execute(stmt)
+                if self.stores % _PRUNE_EVERY == 0:
+                    await uow.session.execute(
+                        delete(LLMResponseCache).where(
+                            LLMResponseCache.expires_at <= datetime.now(timezone.utc)
+                        )
+                    )
+        except Exception as e:
+            await logger.log(level="WARNING", module=__name__, message=f"Response cache write: {e}")
+
+    def stats(self) -> dict[str, Any]:
+        """Hit-rate по обох рівнях: скільки викликів LLM зекономлено."""
+        memory = self._memory.stats()
+        hits = memory["hits"] + self.db_hits
+        lookups = hits + self.misses
+        return {
+            "memory_size": memory["size"],
+            "memory_hits": memory["hits"],
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "bypassed": self.bypassed,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache(
+    ttl=settings.RESPONSE_CACHE_TTL_SEC,
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    max_chars=settings.RESPONSE_CACHE_MAX_CHARS,
+    use_db=settings.RESPONSE_CACHE_DB_ENABLED,
+)
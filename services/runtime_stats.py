@@ -0,0 +1,96 @@
+"""
+Зведені метрики процесу: пул БД, advisory locks, кеші, черга LLM, токени, черги.
+
+Кожен компонент сам рахує свої лічильники (stats()); тут вони збираються в один dict.
+Читаються двома шляхами: GET /stats у webhook-режимі (webhook.py) і рядок INFO у лог
+раз на STATS_LOG_INTERVAL_SEC — у будь-якому режимі, зокрема в polling і у воркерах
+supervisor (кожен воркер — у свій лог-файл).
+
+Компоненти з handlers (chat_dispatcher) реєструються з main через register(): services
+не імпортують handlers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Callable, Optional
+
+from config import settings
+from db import get_lock_stats, get_pool_stats
+from logger import logger
+from services import identity_cache
+from services.chat_service import history_buffer, message_writer
+from services.llm_scheduler import llm_scheduler
+from services.llm_usage import usage_stats
+from services.prompt_store import prompt_store
+from services.response_cache import response_cache
+from services.summarizer import summarizer
+from services.update_dedup import update_dedup
+from tools.executor import get_cache_stats as get_tool_cache_stats
+
+StatsSource = Callable[[], dict]
+
+_sources: dict[str, StatsSource] = {
+    "db_pool": get_pool_stats,
+    "db_locks": get_lock_stats,
+    "llm_scheduler": llm_scheduler.stats,
+    "llm_usage": usage_stats.stats,
+    "response_cache": response_cache.stats,
+    "tool_cache": get_tool_cache_stats,
+    "identity_cache": identity_cache.stats,
+    "history_buffer": history_buffer.stats,
+    "summarizer": summarizer.stats,
+    "update_dedup": update_dedup.stats,
+    "prompts": prompt_store.stats,
+}
+if message_writer is not None:
+    _sources["message_writer"] = message_writer.stats
+
+
+def register(name: str, source: StatsSource) -> None:
+    """Додати джерело метрик (наприклад, chat_dispatcher з handlers)."""
+    _sources[name] = source
+
+
+def collect_stats() -> dict[str, Any]:
+    """Метрики всіх компонентів; помилка одного джерела не ховає решту."""
+    result: dict[str, Any] = {}
+    for name, source in _sources.items():
+        try:
+            result[name] = source()
+        except Exception as e:
+            result[name] = {"error": str(e)}
+    return result
+
+
+def dumps(stats: dict[str, Any]) -> str:
+    return json.dumps(stats, ensure_ascii=False, sort_keys=True, default=str)
+
+
+class StatsReporter:
+    """Раз на interval — один рядок INFO з collect_stats()."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await logger.log(
+                level="INFO", module=__name__, message=f"Stats: {dumps(collect_stats())}"
+            )
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+stats_reporter = StatsReporter(interval=settings.STATS_LOG_INTERVAL_SEC)
@@ -0,0 +1,166 @@
+"""
+Фонове оновлення стислого змісту розмов (Conversation.summary).
+
+Кожні every повідомлень розмова потрапляє в чергу; обмежена кількість workers бере
+повідомлення після summary_upto_id, просить LLM оновити summary і записує результат.
+Відповідь користувачу ніколи не чекає на summarizer: schedule() не блокує, при
+переповненій черзі задача відкидається (наступна спроба — через every повідомлень).
+
+Rollover: нова розмова одразу отримує summary закритої (ChatService._rollover_if_full),
+а фінальне оновлення закритої розмови дописується і в нову (carry_to).
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Optional
+
+from sqlalchemy import or_, select, update
+
+from config import settings
+from db import UnitOfWork
+from db.models import Conversation, Message
+from logger import logger
+from services.ai_service import generate_summary
+
+# Скільки нових повідомлень максимум за одне оновлення; решта — наступним проходом
+_MAX_BATCH = 60
+# Ключ у llm_scheduler: усі summary — одна черга, тож під навантаженням вони
+# отримують не більше своєї частки слотів і не витісняють відповіді користувачам
+_SCHEDULER_KEY = "summarizer"
+
+
+class ConversationSummarizer:
+    """Черга conversation_id → пул workers, що оновлюють summary."""
+
+    def __init__(self, every: int, workers: int, queue_size: int, enabled: bool):
+        self.every = every
+        self.workers = workers
+        self.queue_size = queue_size
+        self.enabled = enabled
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        # conversation_id у черзі → куди перенести результат (rollover) або None
+        self._pending: dict[int, Optional[int]] = {}
+        self.updated = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def maybe_schedule(self, conversation_id: int, count_before: int, count_after: int) -> None:
+        """Поставити в чергу, якщо між count_before і count_after перетнули кратне every."""
+        if count_after // self.every != count_before // self.every:
+            self.schedule(conversation_id)
+
+    def schedule(self, conversation_id: int, carry_to: Optional[int] = None) -> None:
+        """Не блокує. Якщо розмова вже в черзі — лише оновлюємо carry_to."""
+        if not self.enabled:
+            return
+        if conversation_id in self._pending:
+            if carry_to is not None:
+                self._pending[conversation_id] = carry_to
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        if not self._tasks:
+            loop = asyncio.get_running_loop()
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        try:
+            self._queue.put_nowait(conversation_id)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        self._pending[conversation_id] = carry_to
+
+    async def _worker(self) -> None:
+        while True:
+            conversation_id = await self._queue.get()
+            carry_to = self._pending.pop(conversation_id, None)
+            try:
+                await self._summarize(conversation_id, carry_to)
+            except Exception as e:
+                self.failed += 1
+                await logger.log(
+                    level="WARNING",
+                    module=__name__,
+                    message=f"Summary для conversation {conversation_id} не оновлено: {e}",
+                )
+
+    async def _summarize(self, conversation_id: int, carry_to: Optional[int]) -> None:
+        async with UnitOfWork() as uow:
+            row = (
+                await uow.session.execute(
+                    select(Conversation.summary, Conversation.summary_upto_id).where(
+                        Conversation.id == conversation_id
+                    )
+                )
+            ).first()
+            if row is None:
+                return
+            previous, upto_id = row
+            stmt = select(Message.id, Message.role, Message.content).where(
+                Message.conversation_id == conversation_id
+            )
+            if upto_id is not None:
+                stmt = stmt.where(Message.id > upto_id)
+            rows = (await uow.session.execute(stmt.order_by(Message.id).limit(_MAX_BATCH))).all()
+
+        # LLM — поза транзакцією: зʼєднання з БД не тримаємо
+        summary = previous
+        if rows:
+            summary = await generate_summary(
+                previous,
+                [{"role": r.role, "content": r.content} for r in rows],
+                user_key=_SCHEDULER_KEY,
+            )
+            if summary is None:
+                return
+
+        async with UnitOfWork() as uow:
+            if rows:
+                # Не перезаписуємо новіший summary, якщо паралельно встиг інший worker/репліка
+                await uow.session.execute(
+                    update(Conversation)
+                    .where(
+                        Conversation.id == conversation_id,
+                        or_(
+                            Conversation.summary_upto_id.is_(None),
+                            Conversation.summary_upto_id < rows[-1].id,
+                        ),
+                    )
+                    .values(summary=summary, summary_upto_id=rows[-1].id)
+                )
+            if carry_to is not None and summary:
+                # Лише поки нова розмова не має власного summary
+                await uow.session.execute(
+                    update(Conversation)
+                    .where(Conversation.id == carry_to, Conversation.summary_upto_id.is_(None))
+                    .values(summary=summary)
+                )
+        if rows:
+            self.updated += 1
+        if len(rows) == _MAX_BATCH:
+            self.schedule(conversation_id, carry_to)
+
+    async def close(self) -> None:
+        """Зупинити workers (при зупинці бота). Незроблені оновлення просто відкладаються."""
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "updated": self.updated,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+summarizer = ConversationSummarizer(
+    every=settings.SUMMARY_EVERY_MESSAGES,
+    workers=settings.SUMMARY_WORKERS,
+    queue_size=settings.SUMMARY_QUEUE_SIZE,
+    enabled=settings.SUMMARY_ENABLED,
+)
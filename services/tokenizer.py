@@ -0,0 +1,64 @@
+"""
+Підрахунок токенів для бюджету контексту.
+
+tiktoken працює локально, але словник (BPE) завантажує з мережі при першому
+використанні — у Docker-образі він кешується під час збірки (TIKTOKEN_CACHE_DIR),
+тож у runtime мережа не потрібна. Якщо tiktoken не встановлено або словник
+недоступний — груба оцінка за довжиною UTF-8 (для кирилиці ~2 символи на токен).
+
+Словник завантажується один раз: init() у main (в окремому потоці), або ліниво
+при першому count_tokens.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Optional
+
+from config import settings
+
+try:
+    import tiktoken  # type: ignore[import-untyped]
+except Exception:  # pragma: no cover
+    tiktoken = None  # type: ignore[assignment]
+
+# Службові токени на кожне повідомлення в chat-форматі (role, роздільники)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Словник для моделей, яких tiktoken ще не знає
+_DEFAULT_ENCODING = "o200k_base"
+
+_encoding: Any = None
+_loaded = False
+
+
+def init() -> str:
+    """Завантажити словник для OPENAI_MODEL. Повертає назву токенізатора (для логу)."""
+    global _encoding, _loaded
+    if not _loaded:
+        _loaded = True
+        if tiktoken is not None:
+            try:
+                try:
+                    _encoding = tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+                except KeyError:
+                    _encoding = tiktoken.get_encoding(_DEFAULT_ENCODING)
+            except Exception:
+                # Немає мережі і кешу словника — лишаємось на оцінці
+                _encoding = None
+    return _encoding.name if _encoding is not None else "estimate"
+
+
+def count_tokens(text: str) -> int:
+    """Кількість токенів у тексті (без службових токенів повідомлення)."""
+    if not _loaded:
+        init()
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def context_budget(model: Optional[str] = None) -> int:
+    """Бюджет токенів історії для моделі: CONTEXT_TOKEN_BUDGETS[model] або CONTEXT_TOKEN_BUDGET."""
+    model = model or settings.OPENAI_MODEL
+    return settings.CONTEXT_TOKEN_BUDGETS.get(model, settings.CONTEXT_TOKEN_BUDGET)
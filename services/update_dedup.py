@@ -0,0 +1,141 @@
+"""
+Ідемпотентність обробки update Telegram.
+
+Telegram доставляє update повторно: webhook-ретраї після таймауту, рестарт процесу до
+підтвердження offset у polling. Без перевірки кожен повтор — ще один виклик LLM і зайві
+рядки Message. Ключі — update_id і (chat_id, message_id) для нових повідомлень.
+
+Два рівні: in-process LRU (TTLCache, точні ключі — жодних хибних спрацювань, на відміну
+від bloom-фільтра) і таблиця processed_updates, спільна для процесів і реплік:
+INSERT ... ON CONFLICT DO NOTHING RETURNING — один запит і атомарний «claim».
+Update позначається до обробки: повтор, що прийшов під час обробки, теж пропускається,
+а update, обробка якого впала, не повторюється (at-most-once — як і без цього шару).
+
+Помилки Postgres лише логуються, update обробляється: дедуплікація ніколи не губить
+повідомлення. Старі ключі видаляє фонове завдання раз на prune_interval.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Hashable, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+
+from config import settings
+from db import ProcessedUpdate, UnitOfWork
+from logger import logger
+from tools.ttl_cache import TTLCache
+
+
+class UpdateDeduplicator:
+    """memory → Postgres; claim() повертає False для вже баченого update."""
+
+    def __init__(
+        self,
+        enabled: bool,
+        memory_entries: int,
+        retention: float,
+        prune_interval: float,
+    ):
+        self.enabled = enabled
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self._memory: TTLCache[bool] = TTLCache(maxsize=memory_entries, ttl=retention)
+        self._prune_task: Optional[asyncio.Task] = None
+        self.memory_duplicates = 0
+        self.db_duplicates = 0
+        self.claimed = 0
+        self.db_errors = 0
+        self.pruned = 0
+
+    async def claim(
+        self,
+        update_id: int,
+        chat_id: Optional[int] = None,
+        message_id: Optional[int] = None,
+    ) -> bool:
+        """True — update новий, обробляти; False — повтор, пропустити."""
+        if not self.enabled:
+            return True
+        keys: list[Hashable] = [update_id]
+        if chat_id is not None and message_id is not None:
+            keys.append((chat_id, message_id))
+        if any(self._memory.get(key) for key in keys):
+            self.memory_duplicates += 1
+            return False
+        # Одразу в памʼять: паралельний повтор у цьому процесі не дійде до БД
+        for key in keys:
+            self._memory.set(key, True)
+        self._ensure_pruner()
+
+        if not await self._db_claim(update_id, chat_id, message_id):
+            self.db_duplicates += 1
+            return False
+        self.claimed += 1
+        return True
+
+    async def _db_claim(
+        self, update_id: int, chat_id: Optional[int], message_id: Optional[int]
+    ) -> bool:
+        stmt = (
+            insert(ProcessedUpdate)
+            .values(update_id=update_id, chat_id=chat_id, message_id=message_id)
+            .on_conflict_do_nothing()
+            .returning(ProcessedUpdate.update_id)
+        )
+        try:
+            async with UnitOfWork() as uow:
+                inserted = (await uow.session.execute(stmt)).scalar()
+        except Exception as e:
+            self.db_errors += 1
+            await logger.log(level="WARNING", module=__name__, message=f"Update dedup: {e}")
+            return True
+        return inserted is not None
+
+    def _ensure_pruner(self) -> None:
+        if self._prune_task is None or self._prune_task.done():
+            self._prune_task = asyncio.get_running_loop().create_task(self._prune_loop())
+
+    async def _prune_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.prune_interval)
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.retention)
+            try:
+                async with UnitOfWork() as uow:
+                    result = await uow.session.execute(
+                        delete(ProcessedUpdate).where(ProcessedUpdate.created_at < cutoff)
+                    )
+                self.pruned += result.rowcount or 0
+            except Exception as e:
+                await logger.log(
+                    level="WARNING", module=__name__, message=f"Update dedup prune: {e}"
+                )
+
+    async def close(self) -> None:
+        """Зупинити фонове видалення (при зупинці бота)."""
+        if self._prune_task is not None:
+            self._prune_task.cancel()
+            await asyncio.gather(self._prune_task, return_exceptions=True)
+            self._prune_task = None
+
+    def stats(self) -> dict[str, Any]:
+        """Скільки повторів пропущено (кожен — зекономлений виклик LLM)."""
+        return {
+            "memory_size": len(self._memory),
+            "claimed": self.claimed,
+            "memory_duplicates": self.memory_duplicates,
+            "db_duplicates": self.db_duplicates,
+            "db_errors": self.db_errors,
+            "pruned": self.pruned,
+        }
+
+
+update_dedup = UpdateDeduplicator(
+    enabled=settings.UPDATE_DEDUP_ENABLED,
+    memory_entries=settings.UPDATE_DEDUP_MEMORY_ENTRIES,
+    retention=settings.UPDATE_DEDUP_RETENTION_SEC,
+    prune_interval=settings.UPDATE_DEDUP_PRUNE_INTERVAL_SEC,
+)
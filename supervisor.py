@@ -0,0 +1,251 @@
+"""
+Supervisor-режим (WORKER_PROCESSES > 1): один процес приймає оновлення, N процесів-воркерів їх обробляють.
+
+Supervisor лише отримує сирі update (getUpdates або webhook) і кладе їх у чергу воркера
+hash(user_id) % N (chat_id — якщо відправника немає): розмова в БД привʼязана до
+користувача, тож усі його оновлення — з будь-якого чату — йдуть в один процес, порядок
+зберігається, а in-process кеші (identity_cache, history_buffer) лишаються узгодженими. Кожен воркер —
+повноцінний процес бота (main.setup): свій пул зʼєднань з БД, свій OpenAI-клієнт, свій
+лог-файл. Впалий воркер перезапускається з тією ж чергою.
+
+Ліміт зʼєднань з Postgres на хост = WORKER_PROCESSES × (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing as mp
+import queue as queue_module
+import signal
+import traceback
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+from config import settings
+from logger import logger
+from webhook import serve_webhook, wait_for_stop_signal
+
+# Як часто перевіряти, чи живі воркери
+_MONITOR_INTERVAL_SEC = 1.0
+# Скільки чекати воркер при зупинці, перш ніж terminate()
+_WORKER_STOP_TIMEOUT_SEC = 60.0
+# Long polling getUpdates
+_POLL_TIMEOUT_SEC = 25
+
+Forward = Callable[[dict[str, Any]], Awaitable[None]]
+
+
+def shard_for(update: dict[str, Any], workers: int) -> int:
+    """Номер воркера для update: hash(user_id) % workers (або chat id, якщо відправника немає)."""
+    key: Any = update.get("update_id", 0)
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        if value.get("from"):
+            key = value["from"]["id"]
+            break
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            key = chat["id"]
+            break
+    return hash(key) % workers
+
+
+# --- Воркер ---
+
+
+def _worker_main(index: int, updates: Any) -> None:
+    # Ctrl+C отримує вся група процесів — воркер зупиняє supervisor (None у черзі)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker(index, updates))
+
+
+async def _feed(dp: Dispatcher, bot: Bot, update: dict[str, Any]) -> None:
+    try:
+        await dp.feed_raw_update(bot, update)
+    except Exception as e:
+        await logger.log(
+            level="ERROR",
+            module=__name__,
+            message=f"Update {update.get('update_id')} впав: {e}\n{traceback.format_exc()}",
+        )
+
+
+async def _worker(index: int, updates: Any) -> None:
+    # Імпорт тут: main імпортує supervisor лише при запуску, а воркер — окремий процес
+    from main import cleanup, setup
+
+    log_file = Path(settings.LOG_FILE)
+    logger.log_file = str(log_file.with_name(f"{log_file.stem}.worker{index}{log_file.suffix}"))
+
+    bot = Bot(token=settings.BOT_TOKEN)
+    dp = Dispatcher()
+    await setup(dp)
+    await logger.log(level="INFO", module=__name__, message=f"Воркер {index} запущено")
+
+    tasks: set[asyncio.Task] = set()
+    # Слот береться до updates.get: поки всі зайняті, update лишаються в черзі воркера,
+    # вона заповнюється і supervisor притримує нові — замість необмеженої кількості задач
+    in_flight = asyncio.Semaphore(settings.WORKER_MAX_IN_FLIGHT)
+    try:
+        while True:
+            await in_flight.acquire()
+            update = await asyncio.to_thread(updates.get)
+            if update is None:
+                in_flight.release()
+                break
+            # Як polling в aiogram: кожен update — окрема задача
+            task = asyncio.create_task(_feed(dp, bot, update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            task.add_done_callback(lambda _: in_flight.release())
+    finally:
+        if tasks:
+            await asyncio.wait(list(tasks))
+        await cleanup(bot)
+
+
+# --- Supervisor ---
+
+
+class _Workers:
+    """Процеси-воркери та їх черги; перезапуск впалих."""
+
+    def __init__(self, count: int, queue_size: int):
+        self._ctx = mp.get_context("spawn")
+        self.queues = [self._ctx.Queue(maxsize=queue_size) for _ in range(count)]
+        self.processes: list[Any] = [None] * count
+        self.restarts = 0
+        self.stopping = False
+
+    def start(self, index: int) -> None:
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.queues[index]),
+            name=f"bot-worker-{index}",
+            daemon=False,
+        )
+        process.start()
+        self.processes[index] = process
+
+    async def forward(self, update: dict[str, Any]) -> None:
+        updates = self.queues[shard_for(update, len(self.queues))]
+        try:
+            updates.put_nowait(update)
+        except queue_module.Full:
+            # Воркер не встигає — чекаємо (у polling це притримує наступний getUpdates)
+            await asyncio.to_thread(updates.put, update)
+
+    async def monitor(self) -> None:
+        while not self.stopping:
+            await asyncio.sleep(_MONITOR_INTERVAL_SEC)
+            for index, process in enumerate(self.processes):
+                if self.stopping or process.is_alive():
+                    continue
+                self.restarts += 1
+                await logger.log(
+                    level="ERROR",
+                    module=__name__,
+                    message=f"Воркер {index} завершився (exit code {process.exitcode}), перезапуск",
+                )
+                self.start(index)
+
+    async def stop(self) -> None:
+        self.stopping = True
+        for updates in self.queues:
+            try:
+                await asyncio.to_thread(updates.put, None, True, _WORKER_STOP_TIMEOUT_SEC)
+            except queue_module.Full:
+                pass
+        for process in self.processes:
+            await asyncio.to_thread(process.join, _WORKER_STOP_TIMEOUT_SEC)
+            if process.is_alive():
+                process.terminate()
+                await asyncio.to_thread(process.join, 5)
+
+
+async def _poll(bot: Bot, forward: Forward) -> None:
+    """getUpdates без розбору в pydantic: воркер отримує сирий dict."""
+    await bot.delete_webhook()
+    url = f"https://api.telegram.org/bot{settings.BOT_TOKEN}/getUpdates"
+    offset: Optional[int] = None
+    async with aiohttp.ClientSession() as session:
+        while True:
+            params: dict[str, Any] = {"timeout": _POLL_TIMEOUT_SEC}
+            if offset is not None:
+                params["offset"] = offset
+            try:
+                async with session.get(
+                    url, params=params, timeout=aiohttp.ClientTimeout(total=_POLL_TIMEOUT_SEC + 10)
+                ) as response:
+                    payload = await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                await logger.log(level="WARNING", module=__name__, message=f"getUpdates: {e}")
+                await asyncio.sleep(1)
+                continue
+            if not payload.get("ok"):
+                retry_after = (payload.get("parameters") or {}).get("retry_after", 1)
+                await logger.log(
+                    level="WARNING",
+                    module=__name__,
+                    message=f"getUpdates: {payload.get('description')}",
+                )
+                await asyncio.sleep(retry_after)
+                continue
+            for update in payload["result"]:
+                await forward(update)
+                offset = update["update_id"] + 1
+
+
+class _ForwardingRequestHandler(SimpleRequestHandler):
+    """Webhook supervisor: перевірка секрету, update → черга воркера, 200."""
+
+    def __init__(self, bot: Bot, forward: Forward):
+        super().__init__(Dispatcher(), bot, secret_token=settings.WEBHOOK_SECRET)
+        self._forward = forward
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        await self._forward(await request.json())
+        return web.json_response({})
+
+    async def close(self) -> None:
+        pass
+
+
+async def run_supervisor() -> None:
+    workers = _Workers(settings.WORKER_PROCESSES, settings.WORKER_QUEUE_SIZE)
+    for index in range(settings.WORKER_PROCESSES):
+        workers.start(index)
+    monitor = asyncio.create_task(workers.monitor())
+    bot = Bot(token=settings.BOT_TOKEN)
+    await logger.log(
+        level="INFO",
+        module=__name__,
+        message=f"Supervisor: {settings.WORKER_PROCESSES} воркерів, режим {settings.BOT_MODE}",
+    )
+
+    try:
+        if settings.BOT_MODE == "webhook":
+            await serve_webhook(bot, _ForwardingRequestHandler(bot, workers.forward))
+        else:
+            poller = asyncio.create_task(_poll(bot, workers.forward))
+            stop = asyncio.create_task(wait_for_stop_signal())
+            try:
+                await asyncio.wait({poller, stop}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in (poller, stop):
+                    task.cancel()
+                await asyncio.gather(stop, return_exceptions=True)
+            # Впав сам poller (не сигнал зупинки) — прокидаємо помилку
+            if not poller.cancelled() and poller.exception() is not None:
+                raise poller.exception()
+    finally:
+        await workers.stop()
+        monitor.cancel()
+        await bot.session.close()
+        await logger.close()
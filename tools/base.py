@@ -3,12 +3,17 @@
 
 Кожен tool має: name, description, schema (JSON Schema), handler(**kwargs).
 Реєстр зберігає саме це — єдиний формат для всіх tools.
+
+handler може бути sync або async (async def). Sync handler виконується в thread pool
+(або в process pool, якщо cpu_bound=True), щоб не блокувати event loop.
+
+Детерміновані tools можуть вмикати кеш результатів: cache_ttl > 0 (і опційно cache_key).
 """
 
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Callable
+from typing import Any, Awaitable, Callable, Hashable, Optional, Union
 
 
 @dataclass
@@ -18,4 +23,16 @@ class Tool:
     name: str
     description: str
     schema: dict[str, Any]  # JSON Schema для parameters
-    handler: Callable[..., str]  # handler(**kwargs) -> str
+    handler: Callable[..., Union[str, Awaitable[str]]]  # handler(**kwargs) -> str (sync або async)
+    # Таймаут виконання, сек. None — TOOL_DEFAULT_TIMEOUT_SEC з config
+    timeout: Optional[float] = None
+    # Максимальна довжина результату, що йде в модель. None — TOOL_MAX_RESULT_CHARS з config
+    max_result_chars: Optional[int] = None
+    # True — sync handler іде в process pool (CPU-bound). Handler має бути функцією рівня модуля.
+    cpu_bound: bool = False
+    # Кеш результатів для однакових аргументів, сек. None — не кешувати (tool не детермінований)
+    cache_ttl: Optional[float] = None
+    # Ключ кешу з розпарсених args. None — канонічний JSON усіх args
+    cache_key: Optional[Callable[[dict[str, Any]], Hashable]] = None
+    # Однакові конкурентні виклики чекають одне виконання замість N паралельних
+    single_flight: bool = True
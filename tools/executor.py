@@ -0,0 +1,157 @@
+"""
+Виконання tool calls моделі.
+
+Усі tool calls одного ходу моделі виконуються конкурентно (asyncio.gather).
+Async handler — прямо в event loop; sync — у thread pool; cpu_bound — у process pool.
+Кожен виклик обмежений таймаутом, результат — довжиною (щоб не роздувати prompt).
+Помилки не прокидаються: модель отримує текст помилки як результат tool.
+
+Tools з cache_ttl кешуються по (name, key(args)) у LRU+TTL кеші; помилки й таймаути
+не кешуються. single_flight: однакові виклики в польоті ділять одне виконання.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Hashable, Optional
+
+from config import settings
+from tools.base import Tool
+from tools.registry import get_tool_handler, validate_tool_args
+from tools.ttl_cache import TTLCache
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+_result_cache: TTLCache[str] = TTLCache(maxsize=settings.TOOL_CACHE_MAX_ENTRIES)
+# (name, key) → future виконання, яке вже в польоті (single-flight)
+_in_flight: dict[tuple[str, Hashable], asyncio.Future] = {}
+_shared_calls = 0
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(
+            max_workers=settings.TOOL_THREAD_WORKERS, thread_name_prefix="tool"
+        )
+    return _thread_pool
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.TOOL_PROCESS_WORKERS)
+    return _process_pool
+
+
+def _cap_result(tool: Tool, result: Any) -> str:
+    text = result if isinstance(result, str) else str(result)
+    limit = tool.max_result_chars or settings.TOOL_MAX_RESULT_CHARS
+    if len(text) > limit:
+        return text[:limit] + f"\n…[truncated {len(text) - limit} chars]"
+    return text
+
+
+async def _invoke(tool: Tool, args: dict[str, Any]) -> Any:
+    if inspect.iscoroutinefunction(tool.handler):
+        return await tool.handler(**args)
+    pool = _get_process_pool() if tool.cpu_bound else _get_thread_pool()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, functools.partial(tool.handler, **args))
+
+
+async def _run(tool: Tool, args: dict[str, Any]) -> tuple[str, bool]:
+    """Виконання з таймаутом і лімітом. Повертає (результат, ok) — ok=False не кешується."""
+    timeout = tool.timeout or settings.TOOL_DEFAULT_TIMEOUT_SEC
+    try:
+        # Sync handler у потоці не переривається — таймаут лише перестає його чекати
+        result = await asyncio.wait_for(_invoke(tool, args), timeout=timeout)
+    except asyncio.TimeoutError:
+        return f"Tool '{tool.name}' timed out after {timeout:g}s.", False
+    except Exception as e:
+        return f"Tool '{tool.name}' failed: {e}", False
+    return _cap_result(tool, result), True
+
+
+def _cache_key(tool: Tool, args: dict[str, Any]) -> tuple[str, Hashable]:
+    if tool.cache_key is not None:
+        return tool.name, tool.cache_key(args)
+    return tool.name, json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)
+
+
+async def _run_cached(tool: Tool, args: dict[str, Any]) -> str:
+    global _shared_calls
+    key = _cache_key(tool, args)
+    cached = _result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if tool.single_flight:
+        while True:
+            pending = _in_flight.get(key)
+            if pending is None:
+                break
+            _shared_calls += 1
+            # Скасування цього чекача не скасовує спільний виклик
+            result = await asyncio.shield(pending)
+            if result is not None:
+                return result
+            # Виконавця скасували — виклик робимо самі (або чекаємо нового виконавця)
+
+    future: asyncio.Future = asyncio.get_running_loop().create_future()
+    if tool.single_flight:
+        _in_flight[key] = future
+    try:
+        result, ok = await _run(tool, args)
+        if ok:
+            _result_cache.set(key, result, ttl=tool.cache_ttl)
+        future.set_result(result)
+        return result
+    finally:
+        if not future.done():
+            # Виконавця скасували: чекачі з інших ходів не отримують його CancelledError
+            # (вона пройшла б повз except Exception і обірвала б їхні ходи без відповіді) —
+            # None означає «виконай сам»
+            future.set_result(None)
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
+
+
+async def execute_tool(name: str, args: dict[str, Any]) -> str:
+    """Виконує один tool за іменем. Завжди повертає рядок (результат або текст помилки)."""
+    tool = get_tool_handler(name)
+    if not tool:
+        return f"Tool '{name}' is not registered."
+    error = validate_tool_args(name, args)
+    if error:
+        return f"Tool '{name}' invalid arguments: {error}"
+    if tool.cache_ttl:
+        return await _run_cached(tool, args)
+    result, _ = await _run(tool, args)
+    return result
+
+
+async def execute_tool_calls(calls: list[tuple[str, dict[str, Any]]]) -> list[str]:
+    """Конкурентно виконує [(name, args), ...]; результати — у тому ж порядку."""
+    return list(await asyncio.gather(*(execute_tool(name, args) for name, args in calls)))
+
+
+def get_cache_stats() -> dict[str, Any]:
+    """Статистика кешу результатів tools: size, hits, misses, hit_rate, shared (single-flight)."""
+    return {**_result_cache.stats(), "shared": _shared_calls}
+
+
+def shutdown() -> None:
+    """Зупиняє пули (при зупинці бота)."""
+    global _thread_pool, _process_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False)
+        _thread_pool = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False)
+        _process_pool = None
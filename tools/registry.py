@@ -2,17 +2,26 @@
 Реєстр tools для AI function calling.
 
 Зберігає tools у єдиному контракті: name, description, schema, handler.
+
+Tools індексовані за іменем (дублікати — помилка). Після register_all_tools() реєстр
+заморожується: payload для OpenAI (tools=...) і валідатори аргументів будуються
+один раз, а не на кожне повідомлення.
 """
 
 from __future__ import annotations
 
-from typing import Any, Optional
+from typing import Any, Iterable, Optional
 
 from tools.base import Tool
+from tools.validation import ArgsValidator, compile_validator
 
-TOOLS: list[Tool] = []
+TOOLS: dict[str, Tool] = {}
 _TOOLS_REGISTERED: bool = False
 
+# Кеш payload: None — усі tools, frozenset — підмножина за іменами
+_PAYLOAD_CACHE: dict[Optional[frozenset[str]], list[dict[str, Any]]] = {}
+_VALIDATORS: dict[str, ArgsValidator] = {}
+
 
 def register_all_tools() -> None:
     """
@@ -30,33 +39,63 @@ def register_all_tools() -> None:
     from tools import sample_tool  # noqa: F401
 
     _TOOLS_REGISTERED = True
+    # Payload усіх tools будується одразу — перше повідомлення його вже не чекає
+    get_tools()
 
 
 def register_tool(tool: Tool) -> None:
-    """Реєструє tool."""
-    TOOLS.append(tool)
-
-
-def get_tools() -> list[dict[str, Any]]:
+    """Реєструє tool. Повторне імʼя або реєстрація після register_all_tools() — помилка."""
+    if _TOOLS_REGISTERED:
+        raise RuntimeError(
+            f"Tool registry is frozen, cannot register '{tool.name}'. "
+            "Add the import to tools.registry.register_all_tools()."
+        )
+    if tool.name in TOOLS:
+        raise ValueError(f"Tool '{tool.name}' is already registered.")
+    _VALIDATORS[tool.name] = compile_validator(tool.schema)
+    TOOLS[tool.name] = tool
+    _PAYLOAD_CACHE.clear()
+
+
+def _to_openai(t: Tool) -> dict[str, Any]:
+    return {
+        "type": "function",
+        "function": {
+            "name": t.name,
+            "description": t.description,
+            "parameters": t.schema,
+        },
+    }
+
+
+def get_tools(names: Optional[Iterable[str]] = None) -> list[dict[str, Any]]:
     """
     Повертає tools у форматі OpenAI API для chat.completions.create(tools=...).
+
+    names — підмножина tools для конкретної розмови (менше tools = менше prompt-токенів).
+    Невідомі імена ігноруються. Результат кешується — не змінюй повернений список.
+
+    Порядок — за іменем, незалежно від порядку реєстрації чи names: tools ідуть на початку
+    prompt, і однаковий набір має давати побайтово однаковий payload (prompt cache OpenAI).
     """
-    return [
-        {
-            "type": "function",
-            "function": {
-                "name": t.name,
-                "description": t.description,
-                "parameters": t.schema,
-            },
-        }
-        for t in TOOLS
-    ]
+    key = None if names is None else frozenset(names)
+    payload = _PAYLOAD_CACHE.get(key)
+    if payload is None:
+        payload = [
+            _to_openai(t)
+            for t in sorted(TOOLS.values(), key=lambda t: t.name)
+            if key is None or t.name in key
+        ]
+        _PAYLOAD_CACHE[key] = payload
+    return payload
 
 
 def get_tool_handler(name: str) -> Optional[Tool]:
     """Повертає tool за іменем (для виконання після вибору моделлю)."""
-    for t in TOOLS:
-        if t.name == name:
-            return t
-    return None
+    return TOOLS.get(name)
+
+
+def validate_tool_args(name: str, args: dict[str, Any]) -> Optional[str]:
+    """Перевіряє аргументи tool call за попередньо скомпільованою schema. None — все ок."""
+    validator = _VALIDATORS.get(name)
+    return None if validator is None else validator(args)
@@ -0,0 +1,86 @@
+"""
+Валідація аргументів tool calls за Tool.schema (JSON Schema).
+
+Валідатор компілюється один раз при freeze реєстру, а не на кожен виклик.
+Якщо пакет jsonschema встановлено — повна валідація; якщо ні — базова перевірка
+(обовʼязкові поля, типи властивостей, additionalProperties=false).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Optional
+
+try:
+    from jsonschema import validators as _jsonschema_validators  # type: ignore[import-untyped]
+    _jsonschema_available = True
+except Exception:  # pragma: no cover
+    _jsonschema_validators = None
+    _jsonschema_available = False
+
+# validator(args) -> None якщо все ок, інакше текст помилки для моделі
+ArgsValidator = Callable[[dict[str, Any]], Optional[str]]
+
+_JSON_TYPES: dict[str, tuple[type, ...]] = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list,),
+    "null": (type(None),),
+}
+
+
+def _type_matches(value: Any, json_type: Any) -> bool:
+    types = json_type if isinstance(json_type, list) else [json_type]
+    for t in types:
+        expected = _JSON_TYPES.get(t)
+        if expected is None:
+            return True
+        # bool у Python — підклас int, а в JSON Schema — окремий тип
+        if isinstance(value, bool) and t in ("integer", "number"):
+            continue
+        if isinstance(value, expected):
+            return True
+    return False
+
+
+def _compile_basic(schema: dict[str, Any]) -> ArgsValidator:
+    required = list(schema.get("required", []))
+    properties: dict[str, Any] = schema.get("properties", {})
+    types = {k: v["type"] for k, v in properties.items() if isinstance(v, dict) and "type" in v}
+    closed = schema.get("additionalProperties") is False
+
+    def validate(args: dict[str, Any]) -> Optional[str]:
+        missing = [k for k in required if k not in args]
+        if missing:
+            return f"missing required arguments: {', '.join(missing)}"
+        for key, value in args.items():
+            if key not in properties:
+                if closed:
+                    return f"unexpected argument: {key}"
+                continue
+            if key in types and not _type_matches(value, types[key]):
+                return f"argument '{key}' must be of type {types[key]}"
+        return None
+
+    return validate
+
+
+def _compile_jsonschema(schema: dict[str, Any]) -> ArgsValidator:
+    cls = _jsonschema_validators.validator_for(schema)
+    cls.check_schema(schema)
+    validator = cls(schema)
+
+    def validate(args: dict[str, Any]) -> Optional[str]:
+        error = next(iter(validator.iter_errors(args)), None)
+        return None if error is None else error.message
+
+    return validate
+
+
+def compile_validator(schema: dict[str, Any]) -> ArgsValidator:
+    """Компілює валідатор для schema. Некоректна schema — помилка одразу, при реєстрації."""
+    if _jsonschema_available:
+        return _compile_jsonschema(schema)
+    return _compile_basic(schema)
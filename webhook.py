@@ -0,0 +1,130 @@
+"""
+Webhook-режим (BOT_MODE=webhook): aiohttp-сервер приймає оновлення від Telegram.
+
+На відміну від polling, кілька реплік можуть стояти за балансувальником. Запит
+перевіряється за X-Telegram-Bot-Api-Secret-Token, update обробляється у фоновій
+задачі, Telegram одразу отримує 200. Фонових задач — не більше WEBHOOK_MAX_IN_FLIGHT:
+коли ліміт вичерпано, запит чекає вільного місця, не відповідаючи, і Telegram
+(у межах max_connections) сам притримує наступні оновлення.
+
+GET /healthz — для health check балансувальника; GET /stats — метрики процесу
+(services/runtime_stats.py) з тим самим секретом у X-Telegram-Bot-Api-Secret-Token.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import signal
+from typing import Any, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config import settings
+from logger import logger
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """SimpleRequestHandler з обмеженням кількості оновлень в обробці."""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_in_flight: int, **kwargs: Any):
+        super().__init__(dispatcher, bot, handle_in_background=True, **kwargs)
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        update = await request.json(loads=bot.session.json_loads)
+        await self._slots.acquire()
+        task = asyncio.create_task(self._background_feed_update(bot=bot, update=update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        task.add_done_callback(lambda _: self._slots.release())
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def close(self) -> None:
+        """Дочекатися оновлень в обробці. Сесію бота закриває main."""
+        if self._background_feed_update_tasks:
+            await asyncio.wait(list(self._background_feed_update_tasks), timeout=30)
+
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+
+async def _healthz(_request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+async def _stats(request: web.Request) -> web.Response:
+    # Метрики не для публіки — той самий секрет, що й для оновлень від Telegram
+    if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != settings.WEBHOOK_SECRET:
+        return web.Response(status=401)
+    # Імпорт тут: webhook імпортує і supervisor, якому сервіси бота не потрібні
+    from services import runtime_stats
+
+    return web.json_response(runtime_stats.collect_stats(), dumps=runtime_stats.dumps)
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """Підняти сервер, зареєструвати webhook і працювати до SIGINT/SIGTERM."""
+    handler = BoundedRequestHandler(
+        dp,
+        bot,
+        max_in_flight=settings.WEBHOOK_MAX_IN_FLIGHT,
+        secret_token=settings.WEBHOOK_SECRET,
+    )
+    await serve_webhook(bot, handler, dp=dp, allowed_updates=dp.resolve_used_update_types())
+
+
+async def serve_webhook(
+    bot: Bot,
+    handler: SimpleRequestHandler,
+    dp: Optional[Dispatcher] = None,
+    allowed_updates: Optional[list[str]] = None,
+) -> None:
+    """
+    aiohttp-сервер з handler на WEBHOOK_PATH + /healthz (+ /stats, якщо оновлення обробляє
+    цей процес); set_webhook, якщо задано WEBHOOK_BASE_URL. dp — для startup/shutdown подій
+    aiogram (None — supervisor, без обробки: метрики пишуть у лог воркери).
+    """
+    app = web.Application()
+    handler.register(app, path=settings.WEBHOOK_PATH)
+    app.router.add_get("/healthz", _healthz)
+    if dp is not None:
+        app.router.add_get("/stats", _stats)
+        setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=settings.WEBHOOK_HOST, port=settings.WEBHOOK_PORT)
+    await site.start()
+
+    if settings.WEBHOOK_BASE_URL:
+        # Усі репліки ставлять той самий URL — повторний set_webhook нічого не ламає
+        await bot.set_webhook(
+            url=settings.WEBHOOK_BASE_URL.rstrip("/") + settings.WEBHOOK_PATH,
+            secret_token=settings.WEBHOOK_SECRET,
+            allowed_updates=allowed_updates,
+        )
+    await logger.log(
+        level="INFO",
+        module=__name__,
+        message=f"Webhook: {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}",
+    )
+
+    try:
+        await wait_for_stop_signal()
+    finally:
+        # on_shutdown: handler.close() чекає оновлень в обробці
+        await runner.cleanup()
+
+
+async def wait_for_stop_signal() -> None:
+    """Чекати SIGINT/SIGTERM (Docker stop, Ctrl+C)."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # pragma: no cover (Windows)
+            pass
+    await stop.wait()